@@ -8,11 +8,20 @@ Original file is located at
 """
 
 import os
+import copy
+import json
 import math
 import random
+import time
+import warnings
 import numpy as np
 import pandas as pd
 import importlib.util
+from concurrent.futures import ProcessPoolExecutor
+from itertools import permutations
+
+# Geometry / distance: warehouse_geom package (pip install -e packages/warehouse_geom)
+from warehouse_geom import build_neighbor_csr, compute_layered_capacity
 
 # -----------------------------
 # 0) Robust local imports
@@ -24,9 +33,21 @@ def import_from_path(module_name: str, path: str):
     return mod
 
 # Change the path of all the input files when using different files
-GEOM = import_from_path("geometry", "/content/geometry.py")
-DIST = import_from_path("distance", "/content/distance.py")
-VIZ  = import_from_path("metrics_viz_lib", "/content/metrics_viz_lib.py")
+VIZ_LIB_FILE = "/content/metrics_viz_lib.py"
+_VIZ = None
+
+def load_viz():
+    """
+    Visualization library, loaded on first use (dashboards only; the engine
+    itself does not need it).
+    """
+    global _VIZ
+    if _VIZ is None:
+        if os.path.exists(VIZ_LIB_FILE):
+            _VIZ = import_from_path("metrics_viz_lib", VIZ_LIB_FILE)
+        else:
+            _VIZ = importlib.import_module("metrics_viz_lib")
+    return _VIZ
 
 # -----------------------------
 # 1) File configuration
@@ -35,10 +56,25 @@ ALLOC_BASELINE_FILE = "/content/allocations_prototype.csv"
 LOCATIONS_FILE      = "/content/locations_dummy_prototype.csv"
 PARTS_FILE          = "/content/synthetic_parts_generated_prototype.csv"
 OUTPUT_ALLOC_FILE   = "/content/allocations_rl_optimized.csv"
-
-SEED = 42
-random.seed(SEED)
-np.random.seed(SEED)
+Q_TABLE_FILE        = "/content/rl_qtable.npz"  # saved after training, warm-start on reruns
+
+TRAIN_EPISODES   = 6000
+REFRESH_EPISODES = 500   # warm-start: extra episodes on top of a loaded Q-table
+TRAIN_WORKERS    = 1     # > 1: parallel training (train_parallel) with that many processes
+TRAIN_STRATEGY   = "epsilon"  # action selection in training: "epsilon", "ucb1" or "thompson"
+
+SEED = 42  # applied in main()
+LOCAL_SEARCH_ITERATIONS = 0  # post-optimization move budget (improve_solution, ~60k moves/s); 0 disables
+LOCAL_SEARCH_SECONDS = 60.0  # wall-clock safety cap on the local search (None = no cap)
+HIERARCHICAL_OPTIMIZER = False  # zones by transportation LP, then bins per zone (optimize_hierarchical); for very large sites
+PARTITION_WORKERS = 1  # > 1: row-partitioned optimization (optimize_partitioned) with that many processes
+
+# RL state features and their levels (state code = ravel_multi_index over these)
+STATE_FEATURES = {
+    "abc": ("A", "B", "C"),
+    "vol_bucket": (0, 1, 2),
+    "heavy": (0, 1),
+}
 
 # ---------------------------------
 # 2) Loading + schema harmonization
@@ -151,12 +187,30 @@ def normalize_allocations_baseline(df_alloc: pd.DataFrame) -> pd.DataFrame:
 # ----------------------------------------------
 # 3) Geometry wrapper (ONLY via input library)
 # ----------------------------------------------
+# Fit results per (bin shape, SKU shape): dims tuples -> (max_units, orientation, grid).
+# Bins and SKUs repeat a few shapes, so each distinct pair is solved once per run.
+_GEOM_CACHE = {}
+
+def clear_geom_cache():
+    _GEOM_CACHE.clear()
+
+def geom_fit(loc_dims, sku_dims):
+    """
+    Memoized compute_layered_capacity: (max_units, best_orientation, grid).
+    """
+    key = (tuple(loc_dims), tuple(sku_dims))
+    res = _GEOM_CACHE.get(key)
+    if res is None:
+        res = compute_layered_capacity(list(key[0]), list(key[1]))
+        _GEOM_CACHE[key] = res
+    return res
+
 def geom_solve_capacity_and_layout(loc_row: pd.Series, part_row: pd.Series, qty: int):
     # This wrapper handles both Series and Dict inputs because optimizations convert rows to Dicts
-    loc_dims = [float(loc_row["width"]), float(loc_row["depth"]), float(loc_row["height"])]
-    sku_dims = [float(part_row["LEN_MM"]), float(part_row["WID_MM"]), float(part_row["DEP_MM"])]
+    loc_dims = (float(loc_row["width"]), float(loc_row["depth"]), float(loc_row["height"]))
+    sku_dims = (float(part_row["LEN_MM"]), float(part_row["WID_MM"]), float(part_row["DEP_MM"]))
 
-    max_units, best_orient, grid = GEOM.compute_layered_capacity(loc_dims, sku_dims)
+    max_units, best_orient, grid = geom_fit(loc_dims, sku_dims)
     if max_units <= 0 or best_orient is None:
         return None
 
@@ -166,7 +220,9 @@ def geom_solve_capacity_and_layout(loc_row: pd.Series, part_row: pd.Series, qty:
     gx, gy, gz = grid
     ox, oy, oz = best_orient
 
-    full_layers, units_per_layer, partial_units = GEOM.compute_actual_layout(qty, grid)
+    # Layout for any qty follows from the grid (same as compute_actual_layout)
+    units_per_layer = gx * gy
+    full_layers, partial_units = divmod(int(qty), units_per_layer)
 
     return {
         "MAX_UNITS": int(max_units),
@@ -180,6 +236,30 @@ def geom_solve_capacity_and_layout(loc_row: pd.Series, part_row: pd.Series, qty:
         "PARTIAL_UNITS": int(partial_units),
     }
 
+# Same orientation order as compute_layered_capacity (itertools.permutations)
+_ORIENT_PERMS = list(permutations(range(3)))
+
+def geom_capacity_vectorized(loc_dims: np.ndarray, sku_dims) -> np.ndarray:
+    """
+    Vectorized compute_layered_capacity.
+      loc_dims: (n, 3) array [width, depth, height]
+      sku_dims: [LEN_MM, WID_MM, DEP_MM] for one SKU, or (n, 3) for one SKU per bin
+    Returns max_units per bin (n,), 0 where the SKU does not fit.
+    Layout/orientation of a chosen bin still comes from geom_solve_capacity_and_layout.
+    """
+    loc_dims = np.asarray(loc_dims, dtype=float)
+    sku = np.broadcast_to(np.asarray(sku_dims, dtype=float), loc_dims.shape)
+    valid = np.all(sku > 0, axis=-1)
+    sku = np.where(sku > 0, sku, 1.0)
+
+    # fits[:, axis, d] = boxes of SKU dim d along location axis
+    fits = np.floor_divide(loc_dims[:, :, None], sku[:, None, :]).astype(np.int64)
+
+    best = np.zeros(len(loc_dims), dtype=np.int64)
+    for i, j, k in _ORIENT_PERMS:
+        np.maximum(best, fits[:, 0, i] * fits[:, 1, j] * fits[:, 2, k], out=best)
+    return np.where(valid, best, 0)
+
 # ------------------------------------
 # 4) GUIDE PRE-PROCESSING
 # ------------------------------------
@@ -262,6 +342,41 @@ def build_guide_zones(df_loc: pd.DataFrame):
     return df, entrance, max_dist_possible, max_x_dim
 
 
+# Affinity reward (+50 if any neighbor stores a SKU whose unit volume is within +-15%) for many candidate bins at once.
+def affinity_vectorized(indptr: np.ndarray, indices: np.ndarray, bin_unit_vol: np.ndarray, cand_idx, unit_vol, rows=None):
+    """
+    indptr, indices: CSR neighbor adjacency (build_neighbor_csr)
+    bin_unit_vol: unit volume of the SKU assigned to each bin (NaN = empty), shape (n_bins,)
+                  or (n_rows, n_bins) for several occupancies
+    cand_idx: candidate bin indices, any shape
+    unit_vol: unit volume of the SKU being placed, broadcastable to cand_idx
+    rows: occupancy row of each candidate (2-D bin_unit_vol only); default = first index of cand_idx
+    Returns float array shaped like cand_idx (50.0 or 0.0).
+    """
+    cand = np.asarray(cand_idx, dtype=np.int64)
+    flat = cand.reshape(-1)
+
+    starts = indptr[flat]
+    deg = indptr[flat + 1] - starts
+    owner = np.repeat(np.arange(flat.size), deg)
+    offset = np.arange(owner.size) - np.repeat(np.cumsum(deg) - deg, deg)
+    nbr = indices[np.repeat(starts, deg) + offset]
+
+    vols = np.asarray(bin_unit_vol, dtype=float)
+    if vols.ndim == 1:
+        v = vols[nbr]
+    else:
+        if rows is None:
+            rows = np.arange(vols.shape[0]).reshape((-1,) + (1,) * (cand.ndim - 1))
+        v = vols[np.broadcast_to(rows, cand.shape).reshape(-1)[owner], nbr]
+
+    u = np.broadcast_to(np.asarray(unit_vol, dtype=float), cand.shape).reshape(-1)[owner]
+    hit = (v >= 0.85 * u) & (v <= 1.15 * u)
+
+    has_aff = np.bincount(owner[hit], minlength=flat.size) > 0
+    return np.where(has_aff, 50.0, 0.0).reshape(cand.shape)
+
+
 # ---------------------------------------------------
 # 5) RLRelocator (BOX-LEVEL)
 # ---------------------------------------------------
@@ -338,16 +453,73 @@ class RLRelocator:
             (False, False),  # 3
         ]
 
-        # Q-table
-        self.Q = {}
+        # Zone index: per action, integer positions of its bins (into self.loc_ids),
+        # built once. Free bins are tracked with a boolean mask updated on placement.
+        self.loc_ids = self.loc["loc_inst_code"].astype(str).to_numpy()
+        self.loc_pos = {loc_id: i for i, loc_id in enumerate(self.loc_ids)}
+        self.action_index = {a: i for i, a in enumerate(self.actions)}
+
+        is_fast = self.loc["IS_FAST_ZONE"].astype(bool).to_numpy()
+        is_ergo = self.loc["IS_ERGO_ZONE"].astype(bool).to_numpy()
+        self.zone_bins = [np.flatnonzero((is_fast == f) & (is_ergo == e)) for f, e in self.actions]
+        self.zone_bin_ids = [self.loc_ids[idx].tolist() for idx in self.zone_bins]
+        self.zone_pad = np.full((len(self.actions), max(len(z) for z in self.zone_bins)), -1, dtype=np.int64)
+        for a, idx in enumerate(self.zone_bins):
+            self.zone_pad[a, :len(idx)] = idx
+        self.free_mask = np.ones(len(self.loc_ids), dtype=bool)
+
+        # State encoding: integer code over STATE_FEATURES (ABC x volume bucket x heavy)
+        self.state_dims = tuple(len(levels) for levels in STATE_FEATURES.values())
+        self.n_states = int(np.prod(self.state_dims))
+
+        # Q-table (n_states x n_actions) + visit counts (used to merge parallel workers)
+        self.Q = np.zeros((self.n_states, len(self.actions)), dtype=float)
+        self.N = np.zeros((self.n_states, len(self.actions)), dtype=np.int64)
+        self.train_meta = {"episodes": 0}
+        self.training_history = {k: np.zeros(0) for k in ("state", "action", "reward", "epsilon", "q_delta")}
 
         # volume buckets (for state generalization)
         qv = self.parts["UNIT_VOL_MM3"].quantile([0.33, 0.66]).to_dict()
         self.v1 = float(qv.get(0.33, 0.0))
         self.v2 = float(qv.get(0.66, 0.0))
 
-        # neighbors for affinity
-        self.neighbors = self._build_neighbor_map()
+        # neighbors for affinity (CSR over the rows of self.loc)
+        self.nbr_indptr, self.nbr_indices = build_neighbor_csr(self.loc)
+
+        # Static per-bin / per-SKU arrays for vectorized candidate scoring
+        self.bin_dims = self.loc[["width", "depth", "height"]].to_numpy(dtype=float)
+        self.bin_shapes, self.bin_shape_idx = np.unique(self.bin_dims, axis=0, return_inverse=True)
+        self.bin_shape_idx = self.bin_shape_idx.reshape(-1)
+        self.bin_vol = self.loc["LOCATION_VOL_MM3"].to_numpy(dtype=float)
+        self.bin_z = self.loc["z"].to_numpy(dtype=float)
+        self.bin_dist = (
+            np.abs(self.loc["x"].to_numpy(dtype=float) - self.entrance["x"])
+            + np.abs(self.loc["y"].to_numpy(dtype=float) - self.entrance["y"])
+        )
+        self.bin_dist_penalty = (self.bin_dist / self.max_dist_possible) * -100.0
+        self.bin_fast = is_fast
+        self.bin_ergo = is_ergo
+        self.bin_target = is_fast & is_ergo
+        self.bin_heavy_ok = self.bin_z <= 1500.0
+        self.bin_id_rank = np.argsort(np.argsort(self.loc_ids, kind="stable"), kind="stable")
+
+        self.part_pos = {item_id: i for i, item_id in enumerate(self.parts["ITEM_ID"].astype(str))}
+        self.part_dims = self.parts[["LEN_MM", "WID_MM", "DEP_MM"]].to_numpy(dtype=float)
+        self.part_vol = self.parts["UNIT_VOL_MM3"].to_numpy(dtype=float)
+        self.part_heavy = self.parts["IS_HEAVY"].astype(bool).to_numpy()
+        self.part_abc = self.parts["ABC_CLASS"].astype(str).to_numpy()
+        abc_levels = STATE_FEATURES["abc"]
+        self.part_abc_idx = np.array(
+            [abc_levels.index(a) if a in abc_levels else abc_levels.index("C") for a in self.part_abc], dtype=np.int64
+        )
+
+        # Zone reward per (ABC class, bin): A +1000 / B +400 in the target zone (Fast AND Ergo)
+        class_bonus = np.array([{"A": 1000.0, "B": 400.0}.get(a, 0.0) for a in abc_levels])
+        self.zone_reward_table = np.where(self.bin_target, class_bonus[:, None], 0.0)
+
+        self._cap_rows = {}    # shape class -> max units per bin
+        self._cand_index = {}  # (zone, shape class) -> sorted candidate bins (optimize_from_baseline)
+        self._refresh_part_states()
 
 
     # State representation
@@ -358,54 +530,83 @@ class RLRelocator:
             return 1
         return 2
 
-    def _get_state(self, item_id: str):
-        # OPTIMIZED LOOKUP
-        r = self.part_dict.get(str(item_id))
-        if not r:
-            # Fallback (shouldn't happen if inputs align)
-            return ("C", 0, 0)
+    def encode_state(self, abc: str, vol_bucket: int, heavy: int) -> int:
+        abc_levels = STATE_FEATURES["abc"]
+        a = abc_levels.index(abc) if abc in abc_levels else abc_levels.index("C")
+        return int(np.ravel_multi_index((a, int(vol_bucket), int(heavy)), self.state_dims))
+
+    def decode_state(self, state: int):
+        a, vb, heavy = np.unravel_index(int(state), self.state_dims)
+        return (STATE_FEATURES["abc"][a], int(vb), int(heavy))
 
-        abc = str(r.get("ABC_CLASS", "C"))
-        heavy = 1 if bool(r.get("IS_HEAVY", False)) else 0
-        vb = self._vol_bucket(float(r["UNIT_VOL_MM3"]))
-        return (abc, vb, heavy)
+    def _refresh_part_states(self):
+        # State code of every part (recomputed when v1/v2 change)
+        vb = np.where(self.part_vol <= self.v1, 0, np.where(self.part_vol <= self.v2, 1, 2))
+        self.part_state = np.ravel_multi_index((self.part_abc_idx, vb, self.part_heavy.astype(np.int64)), self.state_dims)
+        self._fallback_state = self.encode_state("C", 0, 0)
+
+    def _get_state(self, item_id: str) -> int:
+        p = self.part_pos.get(str(item_id))
+        if p is None:
+            # Fallback (shouldn't happen if inputs align)
+            return self._fallback_state
+        return int(self.part_state[p])
 
     def _Q_row(self, state):
-        if state not in self.Q:
-            self.Q[state] = np.zeros(len(self.actions), dtype=float)
         return self.Q[state]
 
+    def _N_row(self, state):
+        return self.N[state]
+
+    def q_as_dict(self) -> dict:
+        """
+        Visited (or non-zero) states as {(abc, vol_bucket, heavy): Q row} (for printing / inspection).
+        """
+        used = (self.N.sum(axis=1) > 0) | np.any(self.Q != 0, axis=1)
+        return {self.decode_state(s): self.Q[s].copy() for s in np.flatnonzero(used)}
+
+    def set_q_from_dict(self, q_dict: dict):
+        """
+        Fills the Q-table from {(abc, vol_bucket, heavy): Q row}; other states are zero.
+        """
+        self.Q[:] = 0.0
+        for st, row in q_dict.items():
+            self.Q[self.encode_state(*st)] = row
+
+    # -----------------------
+    # Batch action selection / updates
+    # -----------------------
+    def select_actions(self, states, epsilon: float = 0.0, rng=None) -> np.ndarray:
+        """
+        Epsilon-greedy actions for many states at once (argmax over Q rows).
+        """
+        states = np.asarray(states, dtype=np.int64)
+        actions = np.argmax(self.Q[states], axis=1)
+        if epsilon > 0:
+            rng = rng if rng is not None else np.random.default_rng()
+            explore = rng.random(states.size) < epsilon
+            actions[explore] = rng.integers(len(self.actions), size=int(explore.sum()))
+        return actions
+
+    def batch_update(self, states, actions, rewards, alpha: float = 0.25):
+        """
+        One-step updates Q[s, a] += alpha * (r - Q[s, a]) for many episodes at once.
+        k updates of the same (s, a) are applied as k steps towards their mean reward:
+        Q <- (1 - alpha)^k * Q + (1 - (1 - alpha)^k) * mean(r).
+        """
+        flat = np.ravel_multi_index(
+            (np.asarray(states, dtype=np.int64), np.asarray(actions, dtype=np.int64)), self.Q.shape
+        )
+        rewards = np.asarray(rewards, dtype=float)
+
+        keys, inv, counts = np.unique(flat, return_inverse=True, return_counts=True)
+        mean_r = np.bincount(inv, weights=rewards) / counts
+        keep = (1.0 - alpha) ** counts
+
+        q = self.Q.reshape(-1)
+        q[keys] = keep * q[keys] + (1.0 - keep) * mean_r
+        self.N.reshape(-1)[keys] += counts
 
-    # Neighbor map for affinity
-
-    def _build_neighbor_map(self):
-        df = self.loc.copy()
-        df["loc_inst_code"] = df["loc_inst_code"].astype(str)
-        nbr = {k: [] for k in df["loc_inst_code"].tolist()}
-
-        # structured neighbor if available
-        if {"row_num", "bay_num", "level_num"}.issubset(df.columns):
-            g = df.dropna(subset=["row_num", "bay_num", "level_num"]).copy()
-            if not g.empty:
-                for (_, _), grp in g.groupby(["row_num", "level_num"]):
-                    grp2 = grp.sort_values("bay_num")
-                    by_bay = {int(b): str(l) for b, l in zip(grp2["bay_num"].astype(int), grp2["loc_inst_code"].astype(str))}
-                    for bay, loc_id in by_bay.items():
-                        for cand in (bay - 1, bay + 1):
-                            if cand in by_bay:
-                                nbr[loc_id].append(by_bay[cand])
-                return nbr
-
-        # fallback: same (y,z), nearest x
-        for (_, _), grp in df.groupby(["y", "z"]):
-            grp2 = grp.sort_values("x")
-            locs = grp2["loc_inst_code"].astype(str).tolist()
-            for i, loc_id in enumerate(locs):
-                if i - 1 >= 0:
-                    nbr[loc_id].append(locs[i - 1])
-                if i + 1 < len(locs):
-                    nbr[loc_id].append(locs[i + 1])
-        return nbr
 
     # -----------------------
     # Guide scoring helpers
@@ -416,23 +617,13 @@ class RLRelocator:
           Manhattan distance in X/Y only from Entrance (X=0, Y=maxY/2).
           (Do NOT include Z; Z is for ergo/height constraints, not travel.)
         """
-        # OPTIMIZED LOOKUP
-        r = self.loc_dict[str(loc_id)]
-
-        x = float(r["x"])
-        y = float(r["y"])
-        ex = float(self.entrance["x"])
-        ey = float(self.entrance["y"])
-        return float(abs(x - ex) + abs(y - ey))
-
-    def _zone_reward(self, abc_class: str, loc_row: dict) -> float:
-        # loc_row is now a dict from self.loc_dict
-        in_target = bool(loc_row["IS_FAST_ZONE"]) and bool(loc_row["IS_ERGO_ZONE"])
-        if abc_class == "A" and in_target:
-            return 1000.0
-        if abc_class == "B" and in_target:
-            return 400.0
-        return 0.0
+        return float(self.bin_dist[self.loc_pos[str(loc_id)]])
+
+    def _zone_reward(self, abc_class: str, loc_id: str) -> float:
+        abc_levels = STATE_FEATURES["abc"]
+        if abc_class not in abc_levels:
+            return 0.0
+        return float(self.zone_reward_table[abc_levels.index(abc_class), self.loc_pos[str(loc_id)]])
 
     def _distance_penalty(self, dist_from_entrance: float) -> float:
         return (dist_from_entrance / self.max_dist_possible) * -100.0
@@ -444,55 +635,59 @@ class RLRelocator:
         return max(0.0, min(1.0, u))
 
     def _affinity_reward(self, loc_id: str, unit_vol_mm3: float, bin_sku_map: dict) -> float:
+        # Single bin: walk its CSR row (affinity_vectorized is for candidate batches)
         lo = 0.85 * unit_vol_mm3
         hi = 1.15 * unit_vol_mm3
-        for n in self.neighbors.get(str(loc_id), []):
-            sku_n = bin_sku_map.get(str(n))
-            if sku_n is None:
-                continue
-            try:
-                # OPTIMIZED LOOKUP
-                v_n = float(self.part_dict[str(sku_n)]["UNIT_VOL_MM3"])
-            except Exception:
-                continue
-            if lo <= v_n <= hi:
+        i = self.loc_pos[str(loc_id)]
+        for n in self.nbr_indices[self.nbr_indptr[i]: self.nbr_indptr[i + 1]].tolist():
+            sku_n = bin_sku_map.get(self.loc_ids[n])
+            p = self.part_pos.get(str(sku_n)) if sku_n is not None else None
+            if p is not None and lo <= self.part_vol[p] <= hi:
                 return 50.0
         return 0.0
 
     def _score_placement(self, item_id: str, loc_id: str, qty_after: int, geom_pack, bin_sku_map: dict) -> float:
-        # OPTIMIZED LOOKUP
-        part = self.part_dict[str(item_id)]
-        loc_row = self.loc_dict[str(loc_id)]
+        # Static terms are precomputed per bin / per ABC class (see __init__)
+        p = self.part_pos[str(item_id)]
+        i = self.loc_pos[str(loc_id)]
 
         # Illegal
         if geom_pack is None:
             return -10000.0
 
-        if bool(part["IS_HEAVY"]) and float(loc_row["z"]) > 1500.0:
+        if self.part_heavy[p] and not self.bin_heavy_ok[i]:
             return -10000.0
 
-        abc = str(part["ABC_CLASS"])
-        unit_vol = float(part["UNIT_VOL_MM3"])
-        bin_vol = float(loc_row["LOCATION_VOL_MM3"])
-
-        rz = self._zone_reward(abc, loc_row)
-        util = self._util_ratio(unit_vol, qty_after, bin_vol)
-        ru = util * 800.0
-
-        dist = self._dist_from_entrance(loc_id)
-        pdist = self._distance_penalty(dist)
-
+        unit_vol = float(self.part_vol[p])
+        rz = self.zone_reward_table[self.part_abc_idx[p], i]
+        ru = self._util_ratio(unit_vol, qty_after, float(self.bin_vol[i])) * 800.0
         raff = self._affinity_reward(loc_id, unit_vol, bin_sku_map)
 
-        return float(rz + ru + pdist + raff)
+        return float(rz + ru + self.bin_dist_penalty[i] + raff)
 
     # -----------------------
     # Zone bin listing
     # -----------------------
+    def _action_idx(self, action) -> int:
+        if isinstance(action, tuple):
+            return self.action_index[(bool(action[0]), bool(action[1]))]
+        return int(action)
+
     def _bins_in_action_zone(self, action):
-        is_fast, is_ergo = action
-        df = self.loc
-        return df[(df["IS_FAST_ZONE"] == bool(is_fast)) & (df["IS_ERGO_ZONE"] == bool(is_ergo))]["loc_inst_code"].astype(str).tolist()
+        # Precomputed in __init__ (O(1))
+        return self.zone_bin_ids[self._action_idx(action)]
+
+    def _free_bins_in_zone(self, action) -> np.ndarray:
+        # Integer positions of the still-free bins of the zone (masked view of the index)
+        idx = self.zone_bins[self._action_idx(action)]
+        return idx[self.free_mask[idx]]
+
+    def _mark_occupied(self, loc_id: str):
+        self.free_mask[self.loc_pos[str(loc_id)]] = False
+
+    def _reset_occupancy(self):
+        self.free_mask[:] = True
+        self._cand_index = {}
 
     # -------------------------------------------------------
     # Calculate max capacity for a specific bin
@@ -521,13 +716,88 @@ class RLRelocator:
         return int(res["MAX_UNITS"]), res
 
 
+    # -------------------------------------------------------
+    # Vectorized candidate scoring
+    # -------------------------------------------------------
+    def _shape_class(self, p: int):
+        # Capacity only depends on the SKU dims up to orientation (all are tried) and the heavy rule
+        return (tuple(sorted(self.part_dims[p].tolist())), bool(self.part_heavy[p]))
+
+    def _capacity_row(self, item_id: str) -> np.ndarray:
+        """
+        Max units of the SKU in every bin (0 = no fit or heavy above 1500mm).
+        Computed once per shape class.
+        """
+        p = self.part_pos[item_id]
+        key = self._shape_class(p)
+        row = self._cap_rows.get(key)
+        if row is None:
+            # One evaluation per distinct bin shape, broadcast to the bins
+            row = geom_capacity_vectorized(self.bin_shapes, self.part_dims[p])[self.bin_shape_idx]
+            if self.part_heavy[p]:
+                row = np.where(self.bin_heavy_ok, row, 0)
+            self._cap_rows[key] = row
+        return row
+
+    def _bin_unit_vols(self, bins: np.ndarray, bin_sku_map: dict) -> np.ndarray:
+        # Per-bin assigned unit volume (NaN = empty), filled for `bins` only
+        vols = np.full(len(self.loc_ids), np.nan)
+        for b in np.unique(bins):
+            sku_n = bin_sku_map.get(self.loc_ids[b])
+            p = self.part_pos.get(str(sku_n)) if sku_n is not None else None
+            if p is not None:
+                vols[b] = self.part_vol[p]
+        return vols
+
+    def _candidate_neighbors(self, cand_idx: np.ndarray) -> np.ndarray:
+        # All neighbor bins of the candidates (CSR rows concatenated)
+        c = np.asarray(cand_idx, dtype=np.int64).reshape(-1)
+        starts = self.nbr_indptr[c]
+        deg = self.nbr_indptr[c + 1] - starts
+        return self.nbr_indices[np.repeat(starts - (np.cumsum(deg) - deg), deg) + np.arange(deg.sum())]
+
+    def _score_candidates(self, item_id: str, cand_idx: np.ndarray, qty_after: np.ndarray, bin_unit_vol: np.ndarray):
+        """
+        Guide score of placing the SKU in many bins at once (same terms as _score_placement).
+        Returns (feasible mask, util_after, dist, affinity, score), one entry per candidate.
+        """
+        cap = self._capacity_row(item_id)[cand_idx]
+        return self._score_arrays(self.part_pos[item_id], cand_idx, qty_after, bin_unit_vol, cap)
+
+    def _util_after(self, p, cand_idx: np.ndarray, qty_after: np.ndarray) -> np.ndarray:
+        # Utilization ratio after placement, clamped to 0..1 (broadcasts like _score_arrays)
+        bin_vol = self.bin_vol[cand_idx]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            util = np.where(bin_vol > 0, (qty_after * self.part_vol[p]) / bin_vol, 0.0)
+        return np.clip(util, 0.0, 1.0)
+
+    def _score_arrays(self, p, cand_idx: np.ndarray, qty_after: np.ndarray, bin_unit_vol: np.ndarray, cap: np.ndarray, rows=None):
+        """
+        Broadcasting core of _score_candidates.
+          p: part index, or (n, 1) part indices for n rows of candidates
+          cand_idx, qty_after, cap: candidates (..., k)
+          bin_unit_vol: assigned unit volume per bin (NaN = empty), (n_bins,) or (n, n_bins)
+          rows: row of bin_unit_vol for each candidate (see affinity_vectorized)
+        """
+        unit_vol = self.part_vol[p]
+
+        feasible = (cap > 0) & (qty_after <= cap)
+        util = self._util_after(p, cand_idx, qty_after)
+        dist = self.bin_dist[cand_idx]
+
+        aff = affinity_vectorized(self.nbr_indptr, self.nbr_indices, bin_unit_vol, cand_idx, unit_vol, rows=rows)
+
+        rz = self.zone_reward_table[self.part_abc_idx[p], cand_idx]
+
+        score = rz + util * 800.0 + self.bin_dist_penalty[cand_idx] + aff
+        return feasible, util, dist, aff, score
+
     def _pick_best_bin_for_action(
     self,
     item_id: str,
     action,
     bin_sku_map: dict,
-    bin_qty_map: dict,
-    search_cap: int = 250
+    bin_qty_map: dict
 ):
         """
         Hard constraints (already enforced by skipping):
@@ -547,354 +817,1735 @@ class RLRelocator:
           - bin already holding SAME SKU (to fill it more)
         Disallowed:
           - bin holding a DIFFERENT SKU (mixed storage not allowed)
+
+        The lexicographic best (-util_after, dist, -affinity, -score, loc_id) over ALL
+        allowed bins of the zone is found by a best-first search (_select_best), so
+        neighbor lookups are only done for the few bins that can still win.
         """
         item_id = str(item_id)
+        a_idx = self._action_idx(action)
 
-        # OPTIMIZED LOOKUP
-        part = self.part_dict[item_id]
+        zone_idx = self.zone_bins[a_idx]
+        if zone_idx.size == 0:
+            return None
 
-        unit_vol = float(part["UNIT_VOL_MM3"])
-        is_heavy = bool(part["IS_HEAVY"])
+        # Prefer filling already-started bins of same SKU first (helps utilization)
+        cur = [bin_sku_map.get(loc_id) for loc_id in self.zone_bin_ids[a_idx]]
+        same = np.fromiter((c is not None and str(c) == item_id for c in cur), dtype=bool, count=len(cur))
+        empty = np.fromiter((c is None for c in cur), dtype=bool, count=len(cur))
 
-        zone_bins = self._bins_in_action_zone(action)
-        if not zone_bins:
+        cand = np.concatenate([zone_idx[same], zone_idx[empty]])
+        if cand.size == 0:
             return None
 
-        # Prefer filling already-started bins of same SKU first (helps utilization)
-        same_sku_bins, empty_bins = [], []
-        for loc_id in zone_bins:
-            cur = bin_sku_map.get(str(loc_id))
-            if cur is None:
-                empty_bins.append(str(loc_id))
-            elif str(cur) == item_id:
-                same_sku_bins.append(str(loc_id))
-            # else: different SKU => forbidden
+        # BOX-LEVEL: empty bins receive their first box
+        qty_after = np.ones(cand.size, dtype=np.int64)
+        qty_after[: int(same.sum())] += np.fromiter(
+            (int(bin_qty_map.get(loc_id, 0)) for loc_id in self.loc_ids[zone_idx[same]]),
+            dtype=np.int64,
+            count=int(same.sum()),
+        )
 
-        ordered = (same_sku_bins + empty_bins)[: int(search_cap)]
+        best = self._select_best(
+            item_id, cand, qty_after, lambda bins: self._bin_unit_vols(self._candidate_neighbors(bins), bin_sku_map)
+        )
+        if best is None:
+            return None
 
-        best = None
-        # MINIMIZE this tuple:
-        #   (-util_after, dist_to_entrance, -affinity, -score, loc_id)
-        best_key = None
+        b, score = best
+        loc_id = str(self.loc_ids[cand[b]])
+        geom_pack = geom_solve_capacity_and_layout(self.loc_dict[loc_id], self.part_dict[item_id], int(qty_after[b]))
+        return (loc_id, geom_pack, score)
 
-        for loc_id in ordered:
-            # OPTIMIZED LOOKUP
-            loc_row = self.loc_dict[str(loc_id)]
+    def _select_best(self, item_id: str, cand: np.ndarray, qty_after: np.ndarray, unit_vols, batch: int = 32):
+        """
+        Lexicographic best candidate: MINIMIZE (-util_after, dist_to_entrance, -affinity, -score, loc_id).
+
+        Best-first search: feasibility, util_after and dist need no neighbor lookups, so
+        feasible candidates are visited in order of the upper bound (util_after, -dist,
+        affinity <= 50) and fully scored batch by batch (doubling). The search stops once
+        the next bound cannot beat the incumbent; the result equals scoring every candidate.
+          unit_vols(bins): per-bin assigned unit volume (NaN = empty), valid on the neighbors of bins
+        Returns (position in cand, score) or None if no candidate is feasible.
+        """
+        p = self.part_pos[item_id]
+        cap = self._capacity_row(item_id)[cand]
+        c = np.flatnonzero((cap > 0) & (qty_after <= cap))
+        if c.size == 0:
+            return None
 
-            # Hard constraint: heavy above 1500mm forbidden
-            if is_heavy and float(loc_row["z"]) > 1500.0:
-                continue
+        util = self._util_after(p, cand[c], qty_after[c])
+        dist = self.bin_dist[cand[c]]
+        order = np.lexsort((dist, -util))
+        c, util, dist = c[order], util[order], dist[order]
+
+        best, best_key = None, None
+        s = 0
+        while s < c.size:
+            # Bound of every remaining candidate is at most (util[s], -dist[s]) + max affinity
+            if best_key is not None and (-util[s], dist[s]) > best_key[:2]:
+                break
+
+            blk = c[s: s + batch]
+            ok, u, d, aff, score = self._score_arrays(p, cand[blk], qty_after[blk], unit_vols(cand[blk]), cap[blk])
+            ok &= score > -9999
+            if ok.any():
+                k = np.flatnonzero(ok)
+                rank = self.bin_id_rank[cand[blk[k]]]
+                i = k[np.lexsort((rank, -score[k], -aff[k], d[k], -u[k]))[0]]
+                key = (-u[i], d[i], -aff[i], -score[i], self.bin_id_rank[cand[blk[i]]])
+                if best_key is None or key < best_key:
+                    best, best_key = (int(blk[i]), float(score[i])), key
+
+            s += batch
+            batch *= 2
 
-            cur_qty = int(bin_qty_map.get(str(loc_id), 0))
-            qty_after = cur_qty + 1  # BOX-LEVEL
+        return best
 
-            geom_pack = geom_solve_capacity_and_layout(loc_row, part, qty_after)
-            if geom_pack is None:
-                continue  # Hard constraint: must fit
+    def _pick_best_bin_from_arrays(
+        self,
+        item_id: str,
+        action,
+        occ_part: np.ndarray,
+        occ_qty: np.ndarray
+    ):
+        """
+        Same selection as _pick_best_bin_for_action, with occupancy given as arrays
+        indexed like self.loc_ids:
+          occ_part: part index (self.part_pos) stored in each bin, -1 = empty
+          occ_qty:  boxes stored in each bin
+        Returns (bin index, score) or None. No geometry layout is solved (training only).
+        """
+        item_id = str(item_id)
+        zone_idx = self.zone_bins[self._action_idx(action)]
+        if zone_idx.size == 0:
+            return None
 
-            bin_vol = float(loc_row["LOCATION_VOL_MM3"])
-            util_after = self._util_ratio(unit_vol, qty_after, bin_vol)  # 0..1
-            dist = self._dist_from_entrance(loc_id)  # strict 2D manhattan
-            affinity = self._affinity_reward(loc_id, unit_vol, bin_sku_map)  # 0 or 50
-            score = self._score_placement(item_id, loc_id, qty_after, geom_pack, bin_sku_map)
+        cur = occ_part[zone_idx]
+        cand = zone_idx[(cur == self.part_pos[item_id]) | (cur < 0)]
+        if cand.size == 0:
+            return None
 
-            # If score is illegal for any reason, skip (keeps behavior consistent)
-            if score <= -9999:
-                continue
+        qty_after = occ_qty[cand] + 1  # BOX-LEVEL
 
-            key = (-util_after, dist, -affinity, -score, str(loc_id))
+        def unit_vols(bins):
+            nb = self._candidate_neighbors(bins)
+            vols = np.full(len(self.loc_ids), np.nan)
+            vols[nb] = np.where(occ_part[nb] >= 0, self.part_vol[occ_part[nb]], np.nan)
+            return vols
 
-            if best_key is None or key < best_key:
-                best_key = key
-                best = (str(loc_id), geom_pack, float(score))
+        best = self._select_best(item_id, cand, qty_after, unit_vols)
+        if best is None:
+            return None
 
-        return best
+        b, score = best
+        return int(cand[b]), score
 
 
     # --------------------------------------
     # 6) RL Training (one-step, bandit-like)
     # --------------------------------------
-    def train(self, episodes=6000, alpha=0.25, epsilon=1.0, epsilon_decay=0.996, epsilon_min=0.06):
+    def train(
+        self,
+        episodes=6000,
+        alpha=0.25,
+        epsilon=1.0,
+        epsilon_decay=0.996,
+        epsilon_min=0.06,
+        early_stop=False,
+        window=250,
+        reward_tol=0.10,
+        q_tol=0.05,
+        min_visits=20,
+        patience=2,
+        strategy="epsilon",
+        ucb_c=1.0
+    ):
+        """
+        Action selection (strategy):
+          - "epsilon":  epsilon-greedy on Q with decaying epsilon (default)
+          - "ucb1":     argmax mean + ucb_c * scale * sqrt(2 ln n_s / n_sa)
+          - "thompson": argmax of a Gaussian draw N(mean, var / n_sa) per action
+        UCB1 / Thompson use the sample mean and variance of the rewards seen in
+        this call (untried actions of a state first); scale is the reward std.
+        Q is updated the same way for all strategies.
+
+        Per-episode state, action, reward, epsilon and |Q change| are recorded in
+        self.training_history (dict of arrays, one entry per episode run).
+
+        Early stopping (early_stop=True, off by default): checked every `window`
+        episodes (once epsilon has reached epsilon_min for "epsilon"). Training
+        stops when, for `patience` consecutive windows,
+          - every action of every state of the trained SKUs was tried at least
+            min_visits times (in total, warm starts included),
+          - the moving-average reward changed by less than reward_tol (relative), and
+          - in every such state, the largest Q change over the window is below
+            q_tol * max|Q| of that state.
+        With a constant alpha, Q keeps moving by about alpha * reward noise, so
+        calibrate q_tol on training_history before enabling it.
+        """
+        if strategy not in ("epsilon", "ucb1", "thompson"):
+            raise ValueError(f"Unknown strategy: {strategy}")
+
         items = self.parts[self.parts["BOXES_ON_HAND"] > 0]["ITEM_ID"].astype(str).tolist()
         if not items:
             raise ValueError("No items with BOXES_ON_HAND > 0. Cannot train.")
 
-        loc_ids = self.loc["loc_inst_code"].astype(str).tolist()
-
-        for ep in range(int(episodes)):
+        item_idx = np.array([self.part_pos[i] for i in items], dtype=np.int64)
+        item_states = np.unique(self.part_state[item_idx])
+
+        # Reusable occupancy arrays (single SKU per bin); only touched bins are reset
+        n_bins = len(self.loc_ids)
+        occ_part = np.full(n_bins, -1, dtype=np.int64)
+        occ_qty = np.zeros(n_bins, dtype=np.int64)
+        occ_n = max(0, int(0.15 * n_bins))
+        occ_bins = np.zeros(0, dtype=np.int64)
+
+        episodes = int(episodes)
+        rewards = np.zeros(episodes, dtype=float)
+        epsilons = np.zeros(episodes, dtype=float)
+        q_deltas = np.zeros(episodes, dtype=float)
+        states = np.zeros(episodes, dtype=np.int64)
+        actions = np.zeros(episodes, dtype=np.int64)
+
+        # Reward statistics for UCB1 / Thompson (Welford, per state-action and global)
+        r_cnt = np.zeros(self.Q.shape, dtype=np.int64)
+        r_mean = np.zeros(self.Q.shape, dtype=float)
+        r_m2 = np.zeros(self.Q.shape, dtype=float)
+        g_cnt, g_mean, g_m2 = 0, 0.0, 0.0
+
+        window = max(1, int(window))
+        q_snap = self.Q.copy()
+        prev_avg = None
+        calm = 0
+        n_run = 0
+
+        for ep in range(episodes):
             item_id = str(random.choice(items))
             state = self._get_state(item_id)
 
-            if random.random() < epsilon:
-                a_idx = random.randrange(len(self.actions))
+            if strategy == "epsilon":
+                if random.random() < epsilon:
+                    a_idx = random.randrange(len(self.actions))
+                else:
+                    a_idx = int(np.argmax(self.Q[state]))
             else:
-                a_idx = int(np.argmax(self._Q_row(state)))
+                n_sa = r_cnt[state]
+                if (n_sa == 0).any():
+                    a_idx = int(np.argmax(n_sa == 0))
+                else:
+                    scale = max(1.0, math.sqrt(g_m2 / max(1, g_cnt - 1)))
+                    if strategy == "ucb1":
+                        bonus = ucb_c * scale * np.sqrt(2.0 * math.log(n_sa.sum()) / n_sa)
+                        a_idx = int(np.argmax(r_mean[state] + bonus))
+                    else:
+                        var = np.where(n_sa > 1, r_m2[state] / np.maximum(1, n_sa - 1), scale ** 2)
+                        draw = r_mean[state] + np.sqrt(var / n_sa) * np.random.standard_normal(len(self.actions))
+                        a_idx = int(np.argmax(draw))
             action = self.actions[a_idx]
 
-            # random occupancy snapshot (single SKU per bin)
-            bin_sku_map = {l: None for l in loc_ids}
-            bin_qty_map = {l: 0 for l in loc_ids}
-
-            occ_n = max(0, int(0.15 * len(loc_ids)))
-            occ_bins = random.sample(loc_ids, k=occ_n)
+            # random occupancy snapshot
+            occ_part[occ_bins] = -1
+            occ_qty[occ_bins] = 0
+
+            occ_bins = np.random.choice(n_bins, size=occ_n, replace=False)
+            skus = item_idx[np.random.randint(len(item_idx), size=occ_n)]
+
+            # Hard constraints: fit/capacity (geometry) and heavy item forbidden above z>1500
+            max_units = geom_capacity_vectorized(self.bin_dims[occ_bins], self.part_dims[skus])
+            max_units[self.part_heavy[skus] & ~self.bin_heavy_ok[occ_bins]] = 0
+            ok = max_units > 0
+            occ_bins = occ_bins[ok]
+
+            # Assign a random *feasible* qty within capacity (1..min(3, max_units))
+            hi = np.minimum(3, max_units[ok])
+            occ_part[occ_bins] = skus[ok]
+            occ_qty[occ_bins] = 1 + (np.random.random(occ_bins.size) * hi).astype(np.int64)
+
+            best = self._pick_best_bin_from_arrays(item_id, action, occ_part, occ_qty)
+
+            r = -5.0 if best is None else best[1]
+            q = self.Q[state, a_idx]
+            self.Q[state, a_idx] = q + alpha * (r - q)
+            self.N[state, a_idx] += 1
+
+            r_cnt[state, a_idx] += 1
+            d = r - r_mean[state, a_idx]
+            r_mean[state, a_idx] += d / r_cnt[state, a_idx]
+            r_m2[state, a_idx] += d * (r - r_mean[state, a_idx])
+            g_cnt += 1
+            gd = r - g_mean
+            g_mean += gd / g_cnt
+            g_m2 += gd * (r - g_mean)
+
+            states[ep] = state
+            actions[ep] = a_idx
+            rewards[ep] = r
+            epsilons[ep] = epsilon if strategy == "epsilon" else 0.0
+            q_deltas[ep] = abs(alpha * (r - q))
+            n_run = ep + 1
 
-            for b in occ_bins:
-                sku = str(random.choice(items))
+            epsilon = max(epsilon_min, epsilon * epsilon_decay)
 
-                # Enforce single SKU per bin (training snapshot)
-                if bin_sku_map[b] is not None:
-                  continue
+            # Convergence check at window boundaries
+            if n_run % window == 0:
+                avg = float(rewards[n_run - window:n_run].mean())
+                q_change = np.abs(self.Q[item_states] - q_snap[item_states]).max(axis=1)
+                q_scale = np.maximum(1.0, np.abs(self.Q[item_states]).max(axis=1))
+
+                if (
+                    early_stop
+                    and (strategy != "epsilon" or epsilon <= epsilon_min)
+                    and prev_avg is not None
+                    and self.N[item_states].min() >= min_visits
+                    and abs(avg - prev_avg) <= reward_tol * max(1.0, abs(prev_avg))
+                    and (q_change <= q_tol * q_scale).all()
+                ):
+                    calm += 1
+                else:
+                    calm = 0
+
+                prev_avg = avg
+                q_snap[:] = self.Q
+                if calm >= patience:
+                    break
+
+        self.training_history = {
+            "state": states[:n_run],
+            "action": actions[:n_run],
+            "reward": rewards[:n_run],
+            "epsilon": epsilons[:n_run],
+            "q_delta": q_deltas[:n_run],
+        }
+        self.train_meta["episodes"] = int(self.train_meta.get("episodes", 0)) + n_run
+        self.train_meta["epsilon_end"] = float(epsilon)
+        self.train_meta["converged"] = bool(n_run < episodes)
+        self.train_meta["strategy"] = strategy
+        return self.Q
 
-                # OPTIMIZED LOOKUP
-                loc_row = self.loc_dict[str(b)]
-                part_row = self.part_dict[str(sku)]
+    def train_parallel(
+        self,
+        episodes=6000,
+        n_workers=None,
+        sync_every=500,
+        alpha=0.25,
+        epsilon=1.0,
+        epsilon_decay=0.996,
+        epsilon_min=0.06,
+        seed=SEED,
+        strategy="epsilon"
+    ):
+        """
+        Parallel training: n_workers independent copies of the engine (own RNG
+        stream and occupancy snapshots) each run `episodes / n_workers` episodes
+        in a process pool. Every `sync_every` episodes per worker the Q-tables are
+        merged by visit-weighted averaging and broadcast back to the workers.
+
+        Epsilon decays with the episodes run by each worker, as in train();
+        `strategy` is passed to train() in the workers.
+        Returns the merged Q-table; self.training_history holds the rewards of all
+        workers (round by round).
+        """
+        if n_workers is None:
+            n_workers = os.cpu_count() or 1
+        n_workers = max(1, int(n_workers))
+        per_worker = -(-int(episodes) // n_workers)
+        sync_every = max(1, int(sync_every))
+
+        streams = np.random.SeedSequence(seed).spawn(n_workers)
+        history = {"state": [], "action": [], "reward": [], "epsilon": [], "q_delta": []}
+        done = 0
+
+        pool = ProcessPoolExecutor(max_workers=n_workers, initializer=_init_train_worker, initargs=(self,)) if n_workers > 1 else None
+        if pool is None:
+            _init_train_worker(copy.copy(self))
+
+        try:
+            while done < per_worker:
+                n_ep = min(sync_every, per_worker - done)
+                eps = max(epsilon_min, epsilon * epsilon_decay ** done)
+                tasks = [
+                    (self.Q, streams[w].spawn(1)[0], n_ep, alpha, eps, epsilon_decay, epsilon_min, strategy)
+                    for w in range(n_workers)
+                ]
+                results = list(pool.map(_train_worker, tasks)) if pool is not None else [_train_worker(t) for t in tasks]
+
+                self._merge_q_tables([(q, n) for q, n, _ in results])
+                for _, _, h in results:
+                    for k in history:
+                        history[k].append(h[k])
+                done += n_ep
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        self.training_history = {k: np.concatenate(v) if v else np.zeros(0) for k, v in history.items()}
+        self.train_meta["episodes"] = int(self.train_meta.get("episodes", 0)) + per_worker * n_workers
+        self.train_meta["epsilon_end"] = float(max(epsilon_min, epsilon * epsilon_decay ** per_worker))
+        self.train_meta["converged"] = False
+        return self.Q
 
-                # Hard constraint: heavy item forbidden above z>1500
-                if bool(part_row["IS_HEAVY"]) and float(loc_row["z"]) > 1500.0:
-                  continue
+    def _merge_q_tables(self, tables):
+        """
+        Merges worker results [(Q, visits in this round), ...] into self.Q/self.N.
+        Workers start from the same self.Q, so each entry is the average of the
+        worker values weighted by how often each worker updated it (unchanged if
+        no worker visited it).
+        """
+        num = sum(n * q for q, n in tables)
+        den = sum(n for _, n in tables)
+        visited = den > 0
+        self.Q[visited] = num[visited] / den[visited]
+        self.N += den
 
-                # Hard constraint: fit/capacity must exist (geometry lib)
-                # Find max capacity first, by testing qty=1,
-                # then reading MAX_UNITS from the returned geom pack.
-                geom1 = geom_solve_capacity_and_layout(loc_row, part_row, qty=1)
-                if geom1 is None:
-                  continue
+    # --------------------------------------------------------
+    # 6b) Q-table persistence / warm start
+    # --------------------------------------------------------
+    def save_q_table(self, path: str, **metadata):
+        """
+        Saves Q-table, visit counts, state encoding, volume bucket thresholds
+        (v1, v2) and training metadata to a compressed .npz file. Extra keyword
+        arguments are stored as metadata.
+        """
+        meta = {
+            **self.train_meta,
+            "n_parts": int(len(self.parts)),
+            "n_locations": int(len(self.loc)),
+            "actions": [list(a) for a in self.actions],
+            "state_features": {k: list(v) for k, v in STATE_FEATURES.items()},
+            **metadata,
+        }
+        np.savez_compressed(
+            path,
+            q=self.Q,
+            visits=self.N,
+            v_thresholds=np.array([self.v1, self.v2], dtype=float),
+            meta=np.array(json.dumps(meta)),
+        )
 
-                max_units = int(geom1["MAX_UNITS"])
-                if max_units <= 0:
-                  continue
+    def load_q_table(self, path: str) -> dict:
+        """
+        Loads a Q-table saved by save_q_table. The saved v1/v2 replace the ones
+        computed from the current parts so states keep their meaning.
+        Returns the stored metadata.
+        """
+        with np.load(path, allow_pickle=False) as f:
+            meta = json.loads(str(f["meta"]))
+            if [tuple(a) for a in meta.get("actions", [])] != [tuple(a) for a in self.actions]:
+                raise ValueError(f"Q-table in {path} was trained with different actions.")
 
-                # Assign a random *feasible* qty within capacity
-                qty = random.randint(1, min(3, max_units))
+            q = f["q"]
+            saved = {k: list(v) for k, v in meta.get("state_features", {}).items()}
+            if saved != {k: list(v) for k, v in STATE_FEATURES.items()} or q.shape != self.Q.shape:
+                raise ValueError(f"Q-table in {path} uses a different state encoding.")
+            self.Q[:] = q
+            self.N[:] = f["visits"]
 
-                bin_sku_map[b] = sku
-                bin_qty_map[b] = qty
+            self.v1, self.v2 = (float(v) for v in f["v_thresholds"])
 
+        self._refresh_part_states()
+        self.train_meta = {"episodes": int(meta.get("episodes", 0)), "epsilon_end": meta.get("epsilon_end")}
+        return meta
 
-            best = self._pick_best_bin_for_action(item_id, action, bin_sku_map, bin_qty_map, search_cap=180)
+    def warm_start(self, path: str, refresh_episodes: int = 500, alpha=0.25, epsilon=None, epsilon_decay=0.996, epsilon_min=0.06, strategy="epsilon", strict=False):
+        """
+        Loads a saved Q-table and refreshes it with a few training episodes on the
+        current data. Exploration restarts from the epsilon reached when the table
+        was saved (or epsilon_min), not from 1.0; `strategy` is passed to train().
+        A table saved for another site (n_parts / n_locations differ) is refused
+        with strict=True, otherwise loaded with a warning.
+        Returns the stored metadata.
+        """
+        with np.load(path, allow_pickle=False) as f:
+            saved = json.loads(str(f["meta"]))
+        site = {"n_parts": int(len(self.parts)), "n_locations": int(len(self.loc))}
+        diff = {k: (saved.get(k), v) for k, v in site.items() if saved.get(k) != v}
+        if diff:
+            msg = f"Q-table in {path} was saved for another site (saved, current): {diff}"
+            if strict:
+                raise ValueError(msg)
+            warnings.warn(msg)
+
+        meta = self.load_q_table(path)
+        if epsilon is None:
+            epsilon = meta.get("epsilon_end") or epsilon_min
+        if refresh_episodes > 0:
+            self.train(
+                episodes=refresh_episodes,
+                alpha=alpha,
+                epsilon=epsilon,
+                epsilon_decay=epsilon_decay,
+                epsilon_min=epsilon_min,
+                strategy=strategy
+            )
+        return meta
 
-            q = self._Q_row(state)[a_idx]
-            if best is None:
-                self._Q_row(state)[a_idx] = q + alpha * (-5.0 - q)
+    # --------------------------------------------------------
+    # 7) Optimization: BEST FIT BATCH FILLING (Aggr. Utilization)
+    # --------------------------------------------------------
+    def _class_candidates(self, zone, item_id: str, members=None):
+        """
+        Feasible bins of a zone (zone = action index, -1 = all bins) for the
+        SKU's shape class, with their capacity. Built once per (zone, shape class)
+        per optimization; occupied bins are dropped lazily (see _iter_free_bins_best_fit).
+        `members` (bin positions) defines any other zone, `zone` is then only its cache key.
+        """
+        key = (zone, self._shape_class(self.part_pos[item_id]))
+        entry = self._cand_index.get(key)
+        if entry is None:
+            if members is not None:
+                idx = np.asarray(members, dtype=np.int64)
             else:
-                _, _, r = best
-                self._Q_row(state)[a_idx] = q + alpha * (r - q)
+                idx = self.zone_bins[zone] if zone >= 0 else np.arange(len(self.loc_ids))
+            cap = self._capacity_row(item_id)[idx]
+            ok = (cap > 0) & (self.bin_vol[idx] > 0)
+            entry = {"bins": idx[ok], "cap": cap[ok]}
+            self._cand_index[key] = entry
+        return entry
+
+    def _iter_free_bins_best_fit(self, zone, item_id: str, qty: int, batch: int = 16, members=None):
+        """
+        Yields the free feasible bins of a zone for `qty` boxes of the SKU in
+        best-fit order: (-utilization, distance, fill qty, capacity, bin order),
+        utilization = min(qty, cap) * unit_vol / bin_vol.
 
-            epsilon = max(epsilon_min, epsilon * epsilon_decay)
+        Only the best `batch` bins (plus ties on utilization) are sorted at a
+        time; the next batch is selected only if the consumer asks for more.
+        """
+        entry = self._class_candidates(zone, item_id, members)
+
+        # Lazy deletion: compact once a quarter of the candidates is occupied
+        live = self.free_mask[entry["bins"]]
+        if live.size and live.sum() < 0.75 * live.size:
+            entry["bins"], entry["cap"] = entry["bins"][live], entry["cap"][live]
+            live = live[live]
+
+        bins, cap = entry["bins"][live], entry["cap"][live]
+        if bins.size == 0:
+            return
+
+        unit_vol = float(self.part_vol[self.part_pos[item_id]])
+        fill = np.minimum(qty, cap)
+        util = (fill * unit_vol) / self.bin_vol[bins]
+        dist = self.bin_dist[bins]
+
+        remaining = np.arange(bins.size)
+        while remaining.size:
+            k = min(batch, remaining.size)
+            u = util[remaining]
+            thr = np.partition(u, u.size - k)[u.size - k]
+            take = u >= thr  # top-k plus every tie at the threshold
+
+            sel = remaining[take]
+            order = np.lexsort((bins[sel], cap[sel], fill[sel], dist[sel], -util[sel]))
+            for b in bins[sel[order]]:
+                yield int(b)
+
+            remaining = remaining[~take]
+            batch *= 2
+
+    def _items_in_fill_order(self) -> pd.DataFrame:
+        # SKUs with stock, ranked A -> B -> C, then Demand High -> Low
+        items_df = self.parts[self.parts["BOXES_ON_HAND"] > 0].copy()
+        abc_rank = {"A": 0, "B": 1, "C": 2}
+        items_df["_abc_rank"] = items_df["ABC_CLASS"].map(lambda x: abc_rank.get(str(x), 3))
+        return items_df.sort_values(["_abc_rank", "DEMAND"], ascending=[True, False])
 
-        return self.Q
+    def _fill_bins(self, zone, item_id: str, qty_remaining: int, placed_list: list, members=None) -> int:
+        """
+        Fills the free bins of a zone in best-fit order with the SKU's boxes, appends
+        the placements to placed_list and returns the boxes left over.
+        """
+        # Best-fit order is fixed by the qty at the start of the zone
+        cap_row = self._capacity_row(item_id)
+        for bin_idx in self._iter_free_bins_best_fit(zone, item_id, qty_remaining, members=members):
+            if qty_remaining <= 0: break
+
+            actual_fill = min(qty_remaining, int(cap_row[bin_idx]))
+            if actual_fill > 0:
+                bin_id = str(self.loc_ids[bin_idx])
+                placed_list.append({
+                    "loc_inst_code": bin_id,
+                    "ITEM_ID": item_id,
+                    "QTY_ALLOCATED": actual_fill,
+                    "_GEOM": geom_solve_capacity_and_layout(self.loc_dict[bin_id], self.part_dict[item_id], actual_fill)
+                })
+                self._mark_occupied(bin_id)
+                qty_remaining -= actual_fill
+        return qty_remaining
+
+    def _fill_by_zone_preference(self, item_id: str, qty_remaining: int, placed_list: list, part=None) -> int:
+        """
+        Places the SKU's boxes zone by zone in order of RL preference, then in any
+        free bin (global fallback). part = (key, bins per action, all bins) restricts
+        both to a partition (optimize_partitioned). Returns the boxes left over.
+        """
+        # Get RL Zone Preferences
+        state = self._get_state(item_id)
+        qrow = self._Q_row(state)
+        if len(set(qrow.tolist())) == 1: action_indices = [0, 1, 2, 3]
+        else: action_indices = list(np.argsort(qrow)[::-1])
+
+        # Try Zones in order of RL preference
+        for a_idx in action_indices:
+            if qty_remaining <= 0: break
+            if part is None:
+                qty_remaining = self._fill_bins(int(a_idx), item_id, qty_remaining, placed_list)
+            else:
+                qty_remaining = self._fill_bins((part[0], int(a_idx)), item_id, qty_remaining, placed_list, members=part[1][a_idx])
+
+        # Global Fallback (if zones full)
+        if qty_remaining > 0:
+            if part is None:
+                qty_remaining = self._fill_bins(-1, item_id, qty_remaining, placed_list)
+            else:
+                qty_remaining = self._fill_bins((part[0], -1), item_id, qty_remaining, placed_list, members=part[2])
+        return qty_remaining
 
-    # --------------------------------------------------------
-    # 7) Optimization: BEST FIT BATCH FILLING (Aggr. Utilization)
-    # --------------------------------------------------------
     def optimize_from_baseline(self):
         """
         Logic Stack Optimization:
-        1. Hard Constraints: Geometry & Weight (Filtered in _get_bin_capacity)
+        1. Hard Constraints: Geometry & Weight (capacity per shape class, _capacity_row)
         2. Macro-Placement: RL Zone Selection (Fast/Ergo)
         3. Storage Util (Primary): Sort bins by projected % utilization.
         4. Pick Velocity (Micro): Tie-break with distance.
         5. Organization: Tie-break with affinity.
         """
-        items_df = self.parts[self.parts["BOXES_ON_HAND"] > 0].copy()
+        items_df = self._items_in_fill_order()
         if items_df.empty:
             return pd.DataFrame(columns=["loc_inst_code", "ITEM_ID", "QTY_ALLOCATED", "_GEOM"])
 
-        # Rank Items: A -> B -> C, then Demand High -> Low
-        abc_rank = {"A": 0, "B": 1, "C": 2}
-        items_df["_abc_rank"] = items_df["ABC_CLASS"].map(lambda x: abc_rank.get(str(x), 3))
-        items_df = items_df.sort_values(["_abc_rank", "DEMAND"], ascending=[True, False])
+        self._reset_occupancy()
+        placed_list = []
+
+        # ---------------------------------------------------------
+        # 8) MAIN LOOP
+        # ---------------------------------------------------------
+        for _, item in items_df.iterrows():
+            item_id = str(item["ITEM_ID"])
+            qty_remaining = int(item["BOXES_ON_HAND"])
+
+            if qty_remaining <= 0: continue
+
+            self._fill_by_zone_preference(item_id, qty_remaining, placed_list)
+
+        df_solution = pd.DataFrame(placed_list)
+        if df_solution.empty: return df_solution
+        return df_solution.sort_values("loc_inst_code").reset_index(drop=True)
+
+    # --------------------------------------------------------
+    # 7b) Post-optimization: local search (move / swap, simulated annealing)
+    # --------------------------------------------------------
+    def improve_solution(
+        self,
+        df_solution: pd.DataFrame,
+        iterations: int = 500_000,
+        time_budget=None,
+        t_start: float = 50.0,
+        t_end: float = 0.5,
+        swap_prob: float = 0.5,
+        seed=SEED,
+        bins=None,
+    ):
+        """
+        Simulated annealing on a finished allocation (optimize_from_baseline or the
+        heuristic engine output: loc_inst_code, ITEM_ID, QTY_ALLOCATED, one SKU per bin).
+
+        Neighborhoods:
+          - move: the content of an occupied bin goes to a free bin
+          - swap: two bins holding different SKUs exchange their content
+        Hard constraints: the boxes must fit the new bin (capacity per shape class,
+        heavy items never above z > 1500), single SKU per bin.
+
+        Objective: sum of per-bin Guide scores (zone reward + util * 800 + distance
+        penalty + affinity), i.e. "Avg Combined Score" of calculate_warehouse_stats
+        times the number of occupied bins, which moves and swaps do not change.
+        A move only changes the score of the touched bins and of their neighbors
+        (affinity), so each delta is computed from those few bins.
+
+        Temperature decays geometrically from t_start to t_end over iterations moves, so
+        a seed gives the same result on any machine. time_budget (seconds) is only a
+        safety cap: the search stops early when it runs out (None = no cap).
+        bins (positions into self.loc_ids) restricts moves and swaps to those bins; the
+        other bins keep their content but still count as neighbors.
+        Returns (improved df_solution, info dict with scores and move counts).
+        """
+        if df_solution is None or df_solution.empty:
+            return df_solution, {"score_before": 0.0, "score_after": 0.0, "iterations": 0, "accepted": 0}
+
+        if df_solution["loc_inst_code"].astype(str).duplicated().any():
+            raise ValueError("improve_solution expects one row (one SKU) per bin.")
+
+        n_bins = len(self.loc_ids)
+        bins0 = np.array([self.loc_pos[str(l)] for l in df_solution["loc_inst_code"]], dtype=np.int64)
+        parts0 = np.array([self.part_pos[str(i)] for i in df_solution["ITEM_ID"]], dtype=np.int64)
+
+        # Python lists: the inner loop reads single elements
+        occ = [-1] * n_bins
+        qty = [0] * n_bins
+        for b, p, q in zip(bins0.tolist(), parts0.tolist(), df_solution["QTY_ALLOCATED"].astype(int).tolist()):
+            occ[b], qty[b] = p, q
+
+        allowed = np.ones(n_bins, dtype=bool)
+        if bins is not None:
+            allowed[:] = False
+            allowed[np.asarray(bins, dtype=np.int64)] = True
+
+        nbrs = np.split(self.nbr_indices, self.nbr_indptr[1:-1])
+        nbrs = [a.tolist() for a in nbrs]
+        zone_reward = self.zone_reward_table.tolist()
+        part_abc = self.part_abc_idx.tolist()
+        part_vol = self.part_vol.tolist()
+        bin_vol = self.bin_vol.tolist()
+        dist_pen = self.bin_dist_penalty.tolist()
+        item_ids = self.parts["ITEM_ID"].astype(str).tolist()
+
+        def bin_score(b):
+            p = occ[b]
+            if p < 0:
+                return 0.0
+            v = part_vol[p]
+            s = zone_reward[part_abc[p]][b] + min(1.0, qty[b] * v / bin_vol[b]) * 800.0 + dist_pen[b]
+            lo, hi = 0.85 * v, 1.15 * v
+            for n in nbrs[b]:
+                pn = occ[n]
+                if pn >= 0 and lo <= part_vol[pn] <= hi:
+                    return s + 50.0
+            return s
+
+        def touched(b1, b2):
+            return {b1, b2, *nbrs[b1], *nbrs[b2]}
+
+        cap_rows = {}
+        feasible_bins = {}
+
+        def cap_of(p):
+            row = cap_rows.get(p)
+            if row is None:
+                row = self._capacity_row(item_ids[p])
+                cap_rows[p] = row
+                key = self._shape_class(p)
+                if key not in feasible_bins:
+                    feasible_bins[key] = np.flatnonzero((row > 0) & allowed)
+            return row
+
+        occupied = bins0[allowed[bins0]].tolist()   # movable occupied bins (positions change on moves)
+        slot = {b: i for i, b in enumerate(occupied)}
+        total = sum(bin_score(b) for b in bins0.tolist())
+        start_total = best_total = total
+        best = (occ.copy(), qty.copy())
+
+        rng = np.random.default_rng(seed)
+        t0 = time.perf_counter()
+        temp = t_start
+        iters = accepted = 0
+
+        while occupied and iters < iterations:
+            if iters % 256 == 0:
+                if time_budget is not None and time.perf_counter() - t0 >= time_budget:
+                    break
+                temp = t_start * (t_end / t_start) ** (iters / iterations)
+            iters += 1
+
+            b1 = occupied[int(rng.integers(len(occupied)))]
+            p1, q1 = occ[b1], qty[b1]
+
+            if rng.random() < swap_prob and len(occupied) > 1:
+                b2 = occupied[int(rng.integers(len(occupied)))]
+                p2, q2 = occ[b2], qty[b2]
+                if p2 == p1 or cap_of(p1)[b2] < q1 or cap_of(p2)[b1] < q2:
+                    continue
+            else:
+                feas = feasible_bins.get(self._shape_class(p1))
+                if feas is None:
+                    cap_of(p1)
+                    feas = feasible_bins[self._shape_class(p1)]
+                b2 = int(feas[int(rng.integers(feas.size))])
+                p2, q2 = occ[b2], 0
+                if p2 >= 0 or cap_of(p1)[b2] < q1:
+                    continue
+
+            area = touched(b1, b2)
+            before = sum(bin_score(b) for b in area)
+            occ[b1], qty[b1], occ[b2], qty[b2] = p2, q2, p1, q1
+            delta = sum(bin_score(b) for b in area) - before
+
+            if delta >= 0 or rng.random() < math.exp(delta / temp):
+                accepted += 1
+                total += delta
+                if p2 < 0:
+                    # move: b2 becomes occupied, b1 free
+                    i = slot.pop(b1)
+                    occupied[i] = b2
+                    slot[b2] = i
+                if total > best_total + 1e-9:
+                    best_total = total
+                    best = (occ.copy(), qty.copy())
+            else:
+                occ[b1], qty[b1], occ[b2], qty[b2] = p1, q1, p2, q2
+
+        occ, qty = best
+        rows = []
+        old = {str(l): g for l, g in zip(df_solution["loc_inst_code"], df_solution.get("_GEOM", [None] * len(df_solution)))}
+        old_content = {b: (p, q) for b, p, q in zip(bins0.tolist(), parts0.tolist(), df_solution["QTY_ALLOCATED"].astype(int).tolist())}
+        for b in np.flatnonzero(np.asarray(occ) >= 0).tolist():
+            loc_id, item_id = str(self.loc_ids[b]), item_ids[occ[b]]
+            geom = old.get(loc_id) if old_content.get(b) == (occ[b], qty[b]) else None
+            if geom is None:
+                geom = geom_solve_capacity_and_layout(self.loc_dict[loc_id], self.part_dict[item_id], qty[b])
+            rows.append({"loc_inst_code": loc_id, "ITEM_ID": item_id, "QTY_ALLOCATED": qty[b], "_GEOM": geom})
+
+        df_out = pd.DataFrame(rows).sort_values("loc_inst_code").reset_index(drop=True)
+        info = {
+            "score_before": float(start_total),
+            "score_after": float(best_total),
+            "avg_score_before": float(start_total) / len(bins0),
+            "avg_score_after": float(best_total) / len(bins0),
+            "iterations": iters,
+            "accepted": accepted,
+        }
+        return df_out, info
+
+    # --------------------------------------------------------
+    # 7c) Exact benchmark solver (MILP, decomposed by bin shape class)
+    # --------------------------------------------------------
+    def solve_exact(self, time_limit: float = 60.0, n_bins_used=None, mip_rel_gap: float = 1e-4):
+        """
+        Optimal allocation for the Guide score without the affinity term, to benchmark
+        optimize_from_baseline / improve_solution / the heuristic engine (needs SciPy).
+
+        Bins are grouped by (shape class, target zone, heavy allowed): inside a group every
+        bin has the same capacity and zone reward for a given SKU, so only the distance
+        penalty, which does not depend on the SKU, tells its bins apart. The model
+        therefore decides per (SKU, group) how many bins and boxes, and per bin whether it
+        is used. The LP puts the used bins of a group on the best distance penalties:
+          max  sum 800 * unit_vol/bin_vol * y[s,g] + zone_reward[s,g] * n[s,g] + sum dist_penalty[j] * z[j]
+               + 10000 * sum y[s,g]
+          s.t. n[s,g] <= y[s,g] <= cap[s,g] * n[s,g]      (every used bin holds 1..cap boxes)
+               sum_g y[s,g] <= BOXES_ON_HAND[s]           (supply)
+               sum_s n[s,g] = sum_{j in g} z[j]           (bins used in the group)
+               y, n integer; 0 <= z <= 1
+        Placing a box is worth +10000 on top (more than any box can score), so stock is only
+        left out when no bin can hold it (SKU without a feasible bin, site too small);
+        info["unplaced_boxes"] counts those boxes. n_bins_used fixes the number of occupied
+        bins (e.g. to an engine's count, so the total is comparable with its average score
+        per bin).
+
+        The LP relaxation is solved first (seconds even for large sites) and always gives
+        info["bound"], a proven upper bound on the score without affinity of any allocation
+        placing as many boxes as the relaxation (all of them when the site holds them; +50
+        per used bin bounds the full Guide score). The MILP then runs for time_limit
+        seconds. Mid-size instances solve to optimality. On large sites it may stop without
+        an incumbent, and then only the bound is returned (empty df_solution); an incumbent
+        that places fewer boxes gets no info["gap"].
+
+        Returns (df_solution, info). info["objective"] is the score without affinity (the
+        +10000 per box is not included).
+        """
+        from scipy.optimize import milp, LinearConstraint, Bounds
+        from scipy.sparse import coo_matrix, vstack
+
+        items = self.parts[self.parts["BOXES_ON_HAND"] > 0]
+        item_pos = np.array([self.part_pos[str(i)] for i in items["ITEM_ID"]], dtype=np.int64)
+        boxes = items["BOXES_ON_HAND"].astype(int).to_numpy()
+
+        # Bin groups: (shape class, target zone, heavy allowed)
+        usable = np.flatnonzero(self.bin_vol > 0)
+        keys = np.stack([self.bin_shape_idx[usable], self.bin_target[usable], self.bin_heavy_ok[usable]], axis=1)
+        _, group_of = np.unique(keys, axis=0, return_inverse=True)
+        group_of = group_of.reshape(-1)
+        n_groups = int(group_of.max()) + 1 if usable.size else 0
+        group_rep = usable[np.unique(group_of, return_index=True)[1]]
+        group_size = np.bincount(group_of, minlength=n_groups)
+
+        # (SKU, group) pairs with capacity > 0
+        pair_s, pair_g, pair_cap = [], [], []
+        for k, p in enumerate(item_pos.tolist()):
+            cap = self._capacity_row(str(self.parts["ITEM_ID"].iat[p]))[group_rep]
+            g = np.flatnonzero(cap > 0)
+            pair_s.append(np.full(g.size, k))
+            pair_g.append(g)
+            pair_cap.append(cap[g])
+        pair_s = np.concatenate(pair_s) if pair_s else np.zeros(0, dtype=np.int64)
+        pair_g = np.concatenate(pair_g) if pair_g else np.zeros(0, dtype=np.int64)
+        pair_cap = np.concatenate(pair_cap).astype(float) if pair_cap else np.zeros(0)
+
+        n_pairs, n_z = pair_s.size, usable.size
+        yv = np.arange(n_pairs)
+        nv = n_pairs + yv
+        zv = 2 * n_pairs + np.arange(n_z)
+        n_var = 2 * n_pairs + n_z
+
+        p_of_pair = item_pos[pair_s]
+        rep = group_rep[pair_g]
+        c = np.zeros(n_var)
+        c[yv] = -800.0 * self.part_vol[p_of_pair] / self.bin_vol[rep] - 10000.0
+        c[nv] = -self.zone_reward_table[self.part_abc_idx[p_of_pair], rep]
+        c[zv] = -self.bin_dist_penalty[usable]
+
+        def rows(r, cols, vals, n_rows):
+            return coo_matrix((vals, (r, cols)), shape=(n_rows, n_var))
+
+        ones = np.ones(n_pairs)
+        blocks = [
+            rows(np.r_[yv, yv], np.r_[yv, nv], np.r_[ones, -pair_cap], n_pairs),   # y - cap*n <= 0
+            rows(np.r_[yv, yv], np.r_[nv, yv], np.r_[ones, -ones], n_pairs),       # n - y <= 0
+            rows(pair_s, yv, ones, len(item_pos)),                                 # sum_g y <= boxes
+            rows(np.r_[pair_g, group_of], np.r_[nv, zv], np.r_[ones, -np.ones(n_z)], n_groups),  # sum_s n = sum z
+        ]
+        lb = [np.full(n_pairs, -np.inf), np.full(n_pairs, -np.inf), np.zeros(len(item_pos)), np.zeros(n_groups)]
+        ub = [np.zeros(n_pairs), np.zeros(n_pairs), boxes.astype(float), np.zeros(n_groups)]
+        if n_bins_used is not None:
+            blocks.append(rows(np.zeros(n_pairs, dtype=np.int64), nv, ones, 1))
+            lb.append([float(n_bins_used)])
+            ub.append([float(n_bins_used)])
+
+        upper = np.r_[boxes[pair_s], np.minimum(boxes[pair_s], group_size[pair_g]), np.ones(n_z)].astype(float)
+        integrality = np.r_[np.ones(2 * n_pairs), np.zeros(n_z)]
+
+        constraints = LinearConstraint(vstack(blocks).tocsr(), np.concatenate(lb), np.concatenate(ub))
+        bounds = Bounds(np.zeros(n_var), upper)
+
+        relaxed = milp(c, constraints=constraints, integrality=np.zeros(n_var), bounds=bounds)
+
+        # Scores leave out the +10000 per box. The relaxation places every box a bin can
+        # hold, so its bound minus that bonus bounds the score at that box count; the
+        # MILP gap is rescaled to that score
+        max_boxes = 0.0 if relaxed.x is None else float(np.round(relaxed.x[yv].sum()))
+        bonus = 10000.0 * max_boxes
+        rel_gap = float(mip_rel_gap)
+        if relaxed.fun is not None and relaxed.fun != 0:
+            rel_gap *= abs(-relaxed.fun - bonus) / abs(relaxed.fun)
+        res = milp(
+            c,
+            constraints=constraints,
+            integrality=integrality,
+            bounds=bounds,
+            options={"time_limit": float(time_limit), "mip_rel_gap": rel_gap},
+        )
+
+        bound = None if relaxed.fun is None else float(-relaxed.fun)
+        if getattr(res, "mip_dual_bound", None) is not None and np.isfinite(res.mip_dual_bound):
+            bound = float(-res.mip_dual_bound) if bound is None else min(bound, float(-res.mip_dual_bound))
+        if bound is not None:
+            bound -= bonus
+        placed = None if res.x is None else float(np.round(res.x[yv].sum()))
+        objective = None if res.x is None else float(-res.fun) - 10000.0 * placed
+
+        info = {
+            "status": int(res.status),
+            "message": str(res.message),
+            "groups": n_groups,
+            "pairs": n_pairs,
+            "objective": objective,
+            "bound": bound,
+            # Only comparable when the incumbent places every box it can
+            "gap": None if objective is None or not bound or placed < max_boxes else (bound - objective) / abs(bound),
+            "unplaced_boxes": int(boxes.sum() - (max_boxes if placed is None else placed)),
+        }
+        if res.x is None:
+            return pd.DataFrame(columns=["loc_inst_code", "ITEM_ID", "QTY_ALLOCATED", "_GEOM"]), info
 
-        loc_ids = self.loc["loc_inst_code"].astype(str).tolist()
-        occupied_bins = set()
+        y = np.round(res.x[yv]).astype(np.int64)
+        n = np.round(res.x[nv]).astype(np.int64)
+
+        # Concrete bins: per group, the used bins are the best distance penalties
         placed_list = []
+        for g in range(n_groups):
+            members = usable[group_of == g]
+            members = members[np.lexsort((self.bin_id_rank[members], -self.bin_dist_penalty[members]))]
+            nxt = 0
+            for k in np.flatnonzero((pair_g == g) & (n > 0)).tolist():
+                item_id = str(self.parts["ITEM_ID"].iat[item_pos[pair_s[k]]])
+                base, extra = divmod(int(y[k]), int(n[k]))
+                for i in range(int(n[k])):
+                    bin_id = str(self.loc_ids[members[nxt]])
+                    nxt += 1
+                    fill = base + (1 if i < extra else 0)
+                    placed_list.append({
+                        "loc_inst_code": bin_id,
+                        "ITEM_ID": item_id,
+                        "QTY_ALLOCATED": fill,
+                        "_GEOM": geom_solve_capacity_and_layout(self.loc_dict[bin_id], self.part_dict[item_id], fill),
+                    })
+
+        info["bins_used"] = len(placed_list)
+        df_solution = pd.DataFrame(placed_list)
+        if df_solution.empty:
+            return df_solution, info
+        return df_solution.sort_values("loc_inst_code").reset_index(drop=True), info
 
-        # Helper to calculate sorting score for a bin
-        def evaluate_bin(bin_id, item_id, qty_needed, unit_vol, is_heavy):
-            loc_row = self.loc_dict[bin_id]
+    # --------------------------------------------------------
+    # 7d) Hierarchical optimization (SKU volume -> zones, then bins per zone)
+    # --------------------------------------------------------
+    def _zone_labels(self, split_rows: bool = False):
+        """
+        Zone of every usable bin for optimize_hierarchical: the Fast/Ergo quadrant
+        (action index), split by row_num when the locations have it (-1 = no volume).
+        Returns (labels, n_zones).
+        """
+        labels = np.full(len(self.loc_ids), -1, dtype=np.int64)
+        for a, idx in enumerate(self.zone_bins):
+            labels[idx] = a
+        if split_rows and "row_num" in self.loc.columns:
+            _, row_code = np.unique(self.loc["row_num"].astype(str).to_numpy(), return_inverse=True)
+            labels = labels * (int(row_code.max()) + 1) + row_code.reshape(-1)
+        labels[self.bin_vol <= 0] = -1
+        _, labels[labels >= 0] = np.unique(labels[labels >= 0], return_inverse=True)
+        return labels, int(labels.max()) + 1
+
+    def _zone_transport_quotas(self, item_ids, boxes, labels, n_zones, cells_per_sku=4):
+        """
+        Level 1 of optimize_hierarchical: boxes of every SKU per zone cell, from a
+        transportation LP (needs SciPy). A cell is a (zone, bin shape class, heavy
+        allowed) group, so the SKU's capacity cap is the same in all its bins.
+
+        Per (SKU, cell) pair a bin holds fill = min(cap, boxes) boxes, so x boxes use
+        x / fill bins and earn
+          x * (800 * unit_vol / bin_vol + (zone reward + mean distance penalty - lam) / fill)
+          s.t. sum_c x[s,c] <= boxes[s]                   (supply)
+               sum_s x[s,c] / fill[s,c] <= bins[c]        (cell capacity, in bins)
+               x[s,c] <= cap * bins[c]
+        Placing a box is worth +10000 on top, so stock is only left out when the
+        cells cannot hold it. The Guide KPI is the average score per bin, so lam (the
+        price of a bin) is set to the average of the previous solution and the LP is
+        re-solved until that average stops improving (Dinkelbach iteration).
+        The LP only carries the cells_per_sku best cells per SKU by score per bin (None =
+        all). At the final lam, pairs with a positive reduced profit (LP duals) are
+        added until there are none left (column generation), so the LP stays small on
+        large sites and still solves to optimality.
+
+        Returns (cell_of, cell_zone, (sku, cell, boxes)): cell of every bin (-1 =
+        unusable), zone of every cell and the quotas as arrays (SKU = index into item_ids).
+        """
+        from scipy.optimize import linprog
+        from scipy.sparse import coo_matrix, vstack
+
+        usable = np.flatnonzero(labels >= 0)
+        cell_of = np.full(len(self.loc_ids), -1, dtype=np.int64)
+        keys = np.stack([labels[usable], self.bin_shape_idx[usable], self.bin_heavy_ok[usable]], axis=1)
+        _, inv = np.unique(keys, axis=0, return_inverse=True)
+        cell_of[usable] = inv.reshape(-1)
+        n_cells = int(cell_of.max()) + 1 if usable.size else 0
+
+        cell_rep = usable[np.unique(cell_of[usable], return_index=True)[1]]
+        cell_zone = labels[cell_rep]
+        cell_bins = np.bincount(cell_of[usable], minlength=n_cells).astype(float)
+        cell_dist = np.bincount(cell_of[usable], weights=self.bin_dist_penalty[usable], minlength=n_cells) / np.maximum(cell_bins, 1)
+
+        pair_s, pair_c, pair_units = [], [], []
+        for k, item_id in enumerate(item_ids):
+            cap = self._capacity_row(item_id)[cell_rep]
+            c = np.flatnonzero(cap > 0)
+            pair_s.append(np.full(c.size, k))
+            pair_c.append(c)
+            pair_units.append(cap[c])
+
+        pair_s = np.concatenate(pair_s) if pair_s else np.zeros(0, dtype=np.int64)
+        no_quotas = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+        if pair_s.size == 0:
+            return cell_of, cell_zone, no_quotas
+        pair_c = np.concatenate(pair_c)
+        pair_units = np.concatenate(pair_units).astype(np.int64)
+
+        p_of_pair = np.array([self.part_pos[i] for i in item_ids], dtype=np.int64)[pair_s]
+        rep = cell_rep[pair_c]
+        pair_fill = np.minimum(pair_units, boxes[pair_s]).astype(float)
+        pair_box = 800.0 * self.part_vol[p_of_pair] / self.bin_vol[rep]
+        pair_bin = self.zone_reward_table[self.part_abc_idx[p_of_pair], rep] + cell_dist[pair_c]
+        pair_cap = np.minimum(pair_units * cell_bins[pair_c], boxes[pair_s].astype(float))
+        n_feasible = np.bincount(pair_s, weights=cell_bins[pair_c], minlength=len(item_ids))
+
+        def best_per_sku(idx, key):
+            # Pairs idx with the cells_per_sku smallest keys of every SKU
+            if not cells_per_sku:
+                return idx
+            idx = idx[np.lexsort((key, pair_s[idx]))]
+            first = np.r_[True, pair_s[idx][1:] != pair_s[idx][:-1]]
+            start = np.maximum.accumulate(np.where(first, np.arange(idx.size), 0))
+            return idx[np.arange(idx.size) - start < cells_per_sku]
+
+        # Column generation: start from the best cells per SKU by score per bin, add
+        # the pairs with a positive reduced profit (LP duals) until there are none left
+        active = np.zeros(pair_s.size, dtype=bool)
+        active[best_per_sku(np.arange(pair_s.size), -(pair_box * pair_fill + pair_bin))] = True
+        b_ub = np.r_[boxes.astype(float), cell_bins]
+
+        def solve(cost, price=True):
+            while True:
+                cols = np.flatnonzero(active)
+                A = vstack([
+                    coo_matrix((np.ones(cols.size), (pair_s[cols], np.arange(cols.size))), shape=(len(item_ids), cols.size)),
+                    coo_matrix((1.0 / pair_fill[cols], (pair_c[cols], np.arange(cols.size))), shape=(n_cells, cols.size)),
+                ]).tocsr()
+                res = linprog(cost[cols], A_ub=A, b_ub=b_ub, bounds=np.c_[np.zeros(cols.size), pair_cap[cols]], method="highs")
+                if res.x is None:
+                    return None
+                duals = res.ineqlin.marginals
+                reduced = cost - duals[pair_s] - duals[len(item_ids) + pair_c] / pair_fill
+                new = np.flatnonzero(~active & (reduced < -1e-7)) if price else np.zeros(0, dtype=np.int64)
+                if new.size == 0:
+                    x = np.zeros(pair_s.size)
+                    x[cols] = res.x
+                    return x
+                active[best_per_sku(new, reduced[new])] = True
+
+        def average(x):
+            return float((x * (pair_box + pair_bin / pair_fill)).sum()) / max(float((x / pair_fill).sum()), 1e-9)
+
+        # Bin price on the starting cells, column generation only at the final price
+        lam, prev = 0.0, None
+        for i in range(8):
+            final = i == 7 or (prev is not None and lam - prev <= 1e-3 * abs(prev))
+            x = solve(-(pair_box + (pair_bin - lam) / pair_fill + 10000.0), price=final)
+            if x is None or final:
+                break
+            prev, lam = lam, average(x)
+        if x is None:
+            return cell_of, cell_zone, no_quotas
+
+        # Round per SKU (largest remainder), keeping the LP's total for the SKU
+        q = np.floor(x + 1e-9).astype(np.int64)
+        total = np.bincount(pair_s, weights=x, minlength=len(item_ids))
+        short = np.minimum(np.round(total).astype(np.int64), boxes) - np.bincount(pair_s, weights=q, minlength=len(item_ids)).astype(np.int64)
+        by_frac = np.lexsort((-(x - q), pair_s))
+        first = np.searchsorted(pair_s[by_frac], pair_s[by_frac])
+        q[by_frac[np.arange(by_frac.size) - first < short[pair_s[by_frac]]]] += 1
+
+        # Whole bins: a cell needs sum ceil(q / cap) bins. Over-full cells give bins
+        # back, least constrained SKUs (most feasible bins) first; those boxes go to
+        # the fallback of optimize_hierarchical.
+        need = np.bincount(pair_c, weights=-(-q // pair_units), minlength=n_cells)
+        for c in np.flatnonzero(need > cell_bins).tolist():
+            over = int(need[c] - cell_bins[c])
+            pairs = np.flatnonzero((pair_c == c) & (q > 0))
+            for i in pairs[np.lexsort((-pair_s[pairs], -n_feasible[pair_s[pairs]]))].tolist():
+                while over > 0 and q[i] > 0:
+                    q[i] -= q[i] % pair_units[i] or pair_units[i]
+                    over -= 1
+                if over <= 0: break
+
+        nz = q > 0
+        return cell_of, cell_zone, (pair_s[nz], pair_c[nz], q[nz])
+
+    def optimize_hierarchical(self, n_workers=None, split_rows: bool = False, cells_per_sku=4):
+        """
+        Two-level version of optimize_from_baseline for very large sites:
+          1. Zones: SKU boxes -> zone cells (Fast/Ergo quadrants, see _zone_labels, split
+             by bin shape) with a transportation LP (_zone_transport_quotas). The LP
+             replaces the Q-table zone order; its size is SKUs x cells, not SKUs x bins.
+             split_rows=True also splits the zones by row: more parallel zones in level 2,
+             but the cell count (and LP time) then grows with the number of rows.
+          2. Bins: every zone fills its cells with their quotas in best-fit order, as in
+             optimize_from_baseline (same SKU order); zones run in parallel in a process
+             pool (n_workers=1 runs them in-process).
+        Boxes a zone could not place (LP rounding) go through the global best-fit
+        fallback over the bins left free.
+
+        Returns (df_solution, info) with info keys: zones, cells, workers, lp_boxes,
+        overflow_boxes, unplaced_boxes.
+        """
+        items_df = self._items_in_fill_order()
+        info = {"zones": 0, "cells": 0, "workers": 0, "lp_boxes": 0, "overflow_boxes": 0, "unplaced_boxes": 0}
+        if items_df.empty:
+            return pd.DataFrame(columns=["loc_inst_code", "ITEM_ID", "QTY_ALLOCATED", "_GEOM"]), info
 
-            # 1. Hard Constraint: Heavy > 1500mm
-            if is_heavy and float(loc_row["z"]) > 1500.0:
-                return None
+        item_ids = items_df["ITEM_ID"].astype(str).tolist()
+        boxes = items_df["BOXES_ON_HAND"].astype(int).to_numpy()
 
-            # 2. Hard Constraint: Geometry check
-            # Need max capacity to know how much can be actually put in
-            res = geom_solve_capacity_and_layout(loc_row, self.part_dict[item_id], qty=1)
-            if res is None or res["MAX_UNITS"] <= 0:
-                return None
+        labels, n_zones = self._zone_labels(split_rows)
+        cell_of, cell_zone, (q_sku, q_cell, q_boxes) = self._zone_transport_quotas(
+            item_ids, boxes, labels, n_zones, cells_per_sku
+        )
 
-            max_cap = int(res["MAX_UNITS"])
+        # One task per zone: its cells' bins and the (SKU, boxes, cell) quotas in SKU order
+        order = np.argsort(cell_of, kind="stable")
+        bounds = np.searchsorted(cell_of[order], np.arange(len(cell_zone) + 1))
+        q_zone = cell_zone[q_cell]
+        q_order = np.lexsort((q_cell, q_sku, q_zone))
+        tasks = []
+        splits = np.split(q_order, np.flatnonzero(np.diff(q_zone[q_order])) + 1) if q_order.size else []
+        for idx in splits:
+            members = {int(c): order[bounds[c]:bounds[c + 1]] for c in np.unique(q_cell[idx]).tolist()}
+            orders = [(item_ids[k], int(n), int(c)) for k, n, c in zip(q_sku[idx].tolist(), q_boxes[idx].tolist(), q_cell[idx].tolist())]
+            tasks.append((members, orders))
+
+        if n_workers is None:
+            n_workers = min(len(tasks), os.cpu_count() or 1)
+        n_workers = max(1, int(n_workers))
+        info.update(zones=n_zones, cells=len(cell_zone), workers=n_workers, lp_boxes=int(q_boxes.sum()))
+
+        if n_workers > 1:
+            with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_zone_worker, initargs=(self,)) as pool:
+                results = list(pool.map(_zone_worker, tasks))
+        else:
+            _init_zone_worker(self)
+            results = [_zone_worker(t) for t in tasks]
 
-            # Calculate actual fill for this batch
-            fill_qty = min(qty_needed, max_cap)
+        self._reset_occupancy()
+        placed_list = []
+        left = dict(zip(item_ids, boxes.tolist()))
+        for zone_placed in results:
+            for row in zone_placed:
+                self._mark_occupied(row["loc_inst_code"])
+                left[row["ITEM_ID"]] -= int(row["QTY_ALLOCATED"])
+            placed_list.extend(zone_placed)
+
+        # Overflow: global best-fit fallback, in the usual SKU order
+        for item_id in item_ids:
+            if left[item_id] <= 0: continue
+            info["overflow_boxes"] += left[item_id]
+            left[item_id] = self._fill_bins(-1, item_id, left[item_id], placed_list)
+        info["unplaced_boxes"] = int(sum(left.values()))
 
-            # 3. Utilization Score (0.0 to 1.0)
-            bin_vol = float(loc_row["LOCATION_VOL_MM3"])
-            if bin_vol <= 0: return None
+        df_solution = pd.DataFrame(placed_list)
+        if df_solution.empty:
+            return df_solution, info
+        return df_solution.sort_values("loc_inst_code").reset_index(drop=True), info
 
-            stored_vol = fill_qty * unit_vol
-            util_score = stored_vol / bin_vol
+    # --------------------------------------------------------
+    # 7e) Partitioned parallel optimization (rows / x-y tiles, border reconciliation)
+    # --------------------------------------------------------
+    def _partition_labels(self, partition_by: str = "row", n_parts: int = 4):
+        """
+        Partition of every bin for optimize_partitioned:
+          - "row": consecutive row_num blocks with about the same number of bins
+            (rows are never split; x/y tiles when row_num is missing)
+          - "tile": about n_parts tiles on x/y quantiles
+        Returns (labels, n_parts).
+        """
+        n_parts = max(1, int(n_parts))
+        if partition_by == "row" and "row_num" in self.loc.columns:
+            rows = pd.to_numeric(self.loc["row_num"], errors="coerce")
+            keys = rows.fillna(rows.max() + 1).to_numpy() if rows.notna().any() else self.loc["row_num"].astype(str).to_numpy()
+            uniq, row_code, counts = np.unique(keys, return_inverse=True, return_counts=True)
+            before = np.cumsum(counts) - counts
+            row_part = np.minimum((before * n_parts) // max(len(self.loc_ids), 1), n_parts - 1)
+            _, labels = np.unique(row_part[row_code.reshape(-1)], return_inverse=True)
+        elif partition_by in ("row", "tile"):
+            nx = int(math.ceil(math.sqrt(n_parts)))
+            ny = int(math.ceil(n_parts / nx))
+            x, y = self.loc["x"].to_numpy(dtype=float), self.loc["y"].to_numpy(dtype=float)
+            ix = np.searchsorted(np.quantile(x, np.linspace(0, 1, nx + 1)[1:-1]), x, side="right")
+            iy = np.searchsorted(np.quantile(y, np.linspace(0, 1, ny + 1)[1:-1]), y, side="right")
+            _, labels = np.unique(ix * ny + iy, return_inverse=True)
+        else:
+            raise ValueError(f"Unknown partition_by: {partition_by!r} (use 'row' or 'tile').")
+        labels = labels.reshape(-1).astype(np.int64)
+        return labels, int(labels.max()) + 1
 
-            # 4. Distance Score (Lower is better, so we invert or negate)
-            dist = self._dist_from_entrance(bin_id)
+    def _border_bins(self, labels: np.ndarray) -> np.ndarray:
+        # Bins with a neighbor in another partition, plus those neighbors (affinity reach)
+        src = np.repeat(np.arange(len(self.loc_ids)), np.diff(self.nbr_indptr))
+        cross = labels[src] != labels[self.nbr_indices]
+        return np.unique(np.r_[src[cross], self.nbr_indices[cross]])
 
-            # 5. Affinity (Bonus if neighbor has similar volume)
-            affinity_bonus = 0.0
-            nbrs = self.neighbors.get(bin_id, [])
-            # For batch optimization, checking neighbors is tricky because they might be empty.
-            # A simplified check: is it next to an occupied bin of similar type?
+    def _partition_quotas(self, item_ids, boxes, part_of: np.ndarray, n_parts: int) -> dict:
+        """
+        Boxes of every SKU per partition for optimize_partitioned, in SKU order.
+
+        Bins are counted per partition and group (bin shape class, heavy allowed,
+        target zone); inside a group every bin holds the same number of the SKU's
+        boxes. Every SKU goes to the partition with the best utilization still
+        reachable (best fit), then the most free feasible bins (target-zone bins first
+        for A/B SKUs, other bins first for C), and uses its preferred, largest-capacity
+        groups there; a SKU only spills into the next partition when one is full.
+        Returns {(partition, SKU index): boxes}.
+        """
+        usable = np.flatnonzero(self.bin_vol > 0)
+        keys = np.stack([self.bin_shape_idx[usable], self.bin_heavy_ok[usable], self.bin_target[usable]], axis=1)
+        _, group_of = np.unique(keys, axis=0, return_inverse=True)
+        group_of = group_of.reshape(-1)
+        n_groups = int(group_of.max()) + 1 if usable.size else 0
+        group_rep = usable[np.unique(group_of, return_index=True)[1]]
+        group_target = self.bin_target[group_rep]
+
+        free = np.zeros((n_parts, n_groups), dtype=np.int64)
+        np.add.at(free, (part_of[usable], group_of), 1)
+
+        quota = {}
+        for k, (item_id, qty) in enumerate(zip(item_ids, boxes.tolist())):
+            p = self.part_pos[item_id]
+            cap = self._capacity_row(item_id)[group_rep]
+            g = np.flatnonzero(cap > 0)
+            if g.size == 0: continue
+            prefer = group_target[g] == (self.zone_reward_table[self.part_abc_idx[p]].max() > 0)
+            order = np.lexsort((-cap[g], ~prefer))   # preferred zone first, then best fit
+            g, prefer = g[order], prefer[order]
+
+            # Partition order: best reachable utilization, then free preferred / all bins
+            avail = free[:, g]
+            util = np.minimum(qty, cap[g]) * self.part_vol[p] / self.bin_vol[group_rep[g]]
+            best_util = np.where(avail > 0, util, 0.0).max(axis=1)
+            for part in np.lexsort((-avail.sum(axis=1), -avail[:, prefer].sum(axis=1), -best_util)).tolist():
+                if qty <= 0: break
+                for j in g.tolist():
+                    if qty <= 0: break
+                    n = min(int(free[part, j]), -(-qty // int(cap[j])))
+                    if n <= 0: continue
+                    placed = min(qty, n * int(cap[j]))
+                    free[part, j] -= n
+                    quota[(part, k)] = quota.get((part, k), 0) + placed
+                    qty -= placed
+        return quota
+
+    def optimize_partitioned(
+        self,
+        n_workers=None,
+        partition_by: str = "row",
+        n_parts=None,
+        local_search_iterations: int = 0,
+        reconcile_iterations: int = 300_000,
+        seed=SEED,
+    ):
+        """
+        optimize_from_baseline on bin partitions in a process pool:
+          1. Partition the bins by row_num blocks or x/y tiles (_partition_labels),
+             n_parts defaults to n_workers.
+          2. SKU quotas per partition (_partition_quotas): whole SKUs where they fit,
+             balancing the free bins of the partitions.
+          3. Every partition runs the RL zone order + best-fit filling on its own bins
+             (and improve_solution for local_search_iterations if > 0) in a worker.
+          4. Boxes that did not fit their partition go through the global
+             optimize_from_baseline placement on the bins left free.
+          5. Reconciliation: partitions cannot see each other's SKUs, so affinity is
+             wrong across their borders; improve_solution runs for reconcile_iterations
+             on the border bins only (none for row partitions: bin neighbors share a row).
+        Wall-clock time of steps 3 (and the local search) divides by the workers.
+
+        Returns (df_solution, info) with info keys: partitions, workers, border_bins,
+        overflow_boxes, unplaced_boxes, reconcile (improve_solution info or None).
+        """
+        items_df = self._items_in_fill_order()
+        if n_workers is None:
+            n_workers = os.cpu_count() or 1
+        n_workers = max(1, int(n_workers))
+        info = {"partitions": 0, "workers": n_workers, "border_bins": 0, "overflow_boxes": 0, "unplaced_boxes": 0, "reconcile": None}
+        if items_df.empty:
+            return pd.DataFrame(columns=["loc_inst_code", "ITEM_ID", "QTY_ALLOCATED", "_GEOM"]), info
 
-            # Return tuple for sorting:
-            # (Utilization DESC, Distance ASC) -> Python sorts tuples element-wise
-            # Used negative for utilization to sort Descending with default sort
-            return (-util_score, dist, fill_qty, max_cap)
+        item_ids = items_df["ITEM_ID"].astype(str).tolist()
+        boxes = items_df["BOXES_ON_HAND"].astype(int).to_numpy()
 
-        # ---------------------------------------------------------
-        # 8) MAIN LOOP
-        # ---------------------------------------------------------
-        for _, item in items_df.iterrows():
-            item_id = str(item["ITEM_ID"])
-            qty_remaining = int(item["BOXES_ON_HAND"])
-            unit_vol = float(item["UNIT_VOL_MM3"])
-            is_heavy = bool(item["IS_HEAVY"])
+        part_of, n_parts = self._partition_labels(partition_by, n_parts or n_workers)
+        quota = self._partition_quotas(item_ids, boxes, part_of, n_parts)
 
-            if qty_remaining <= 0: continue
+        tasks = []
+        for part in range(n_parts):
+            orders = [(item_ids[k], quota[(part, k)]) for k in range(len(item_ids)) if (part, k) in quota]
+            if orders:
+                members = np.flatnonzero(part_of == part)
+                tasks.append((part, members, orders, int(local_search_iterations), seed))
+        info["partitions"] = n_parts
 
-            # Get RL Zone Preferences
-            state = self._get_state(item_id)
-            qrow = self._Q_row(state)
-            if len(set(qrow.tolist())) == 1: action_indices = [0, 1, 2, 3]
-            else: action_indices = list(np.argsort(qrow)[::-1])
-
-            # Try Zones in order of RL preference
-            for a_idx in action_indices:
-                if qty_remaining <= 0: break
-
-                action = self.actions[int(a_idx)]
-
-                # Get empty candidates in this zone
-                zone_bins = [b for b in self._bins_in_action_zone(action) if b not in occupied_bins]
-                if not zone_bins: continue
-
-                # SCORING CANDIDATES
-                candidates = []
-                for b in zone_bins:
-                    score = evaluate_bin(b, item_id, qty_remaining, unit_vol, is_heavy)
-                    if score:
-                        # score structure: (-util, dist, fill_qty, max_cap)
-                        candidates.append((score, b))
-
-                # Sort: Best Utilization first, then closest Distance
-                candidates.sort(key=lambda x: x[0])
-
-                # Fill
-                for score_tuple, bin_id in candidates:
-                    if qty_remaining <= 0: break
-
-                    _, _, fill_qty, _ = score_tuple
-
-
-                    # Re-calc capacity just to be safe and get geom data
-                    max_cap, geom_data = self._get_bin_capacity(bin_id, item_id)
-                    actual_fill = min(qty_remaining, max_cap)
-
-                    if actual_fill > 0:
-                        placed_list.append({
-                            "loc_inst_code": bin_id,
-                            "ITEM_ID": item_id,
-                            "QTY_ALLOCATED": actual_fill,
-                            "_GEOM": geom_solve_capacity_and_layout(self.loc_dict[bin_id], self.part_dict[item_id], actual_fill)
-                        })
-                        occupied_bins.add(bin_id)
-                        qty_remaining -= actual_fill
-
-            # Global Fallback (if zones full)
-            if qty_remaining > 0:
-                global_bins = [b for b in loc_ids if b not in occupied_bins]
-                candidates = []
-                for b in global_bins:
-                    score = evaluate_bin(b, item_id, qty_remaining, unit_vol, is_heavy)
-                    if score: candidates.append((score, b))
-
-                candidates.sort(key=lambda x: x[0])
-
-                for score_tuple, bin_id in candidates:
-                    if qty_remaining <= 0: break
-                    max_cap, geom_data = self._get_bin_capacity(bin_id, item_id)
-                    actual_fill = min(qty_remaining, max_cap)
-                    if actual_fill > 0:
-                        placed_list.append({
-                            "loc_inst_code": bin_id,
-                            "ITEM_ID": item_id,
-                            "QTY_ALLOCATED": actual_fill,
-                            "_GEOM": geom_solve_capacity_and_layout(self.loc_dict[bin_id], self.part_dict[item_id], actual_fill)
-                        })
-                        occupied_bins.add(bin_id)
-                        qty_remaining -= actual_fill
+        if n_workers > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers=min(n_workers, len(tasks)), initializer=_init_partition_worker, initargs=(self,)) as pool:
+                results = list(pool.map(_partition_worker, tasks))
+        else:
+            _init_partition_worker(self)
+            results = [_partition_worker(t) for t in tasks]
+
+        self._reset_occupancy()
+        placed_list = []
+        left = dict(zip(item_ids, boxes.tolist()))
+        for part_placed in results:
+            for row in part_placed:
+                self._mark_occupied(row["loc_inst_code"])
+                left[row["ITEM_ID"]] -= int(row["QTY_ALLOCATED"])
+            placed_list.extend(part_placed)
+
+        # Overflow: whole-site placement (RL zone order, global fallback) on the free bins
+        for item_id in item_ids:
+            if left[item_id] <= 0: continue
+            info["overflow_boxes"] += left[item_id]
+            left[item_id] = self._fill_by_zone_preference(item_id, left[item_id], placed_list)
+        info["unplaced_boxes"] = int(sum(left.values()))
 
         df_solution = pd.DataFrame(placed_list)
-        if df_solution.empty: return df_solution
-        return df_solution.sort_values("loc_inst_code").reset_index(drop=True)
+        if df_solution.empty:
+            return df_solution, info
+        df_solution = df_solution.sort_values("loc_inst_code").reset_index(drop=True)
+
+        border = self._border_bins(part_of)
+        info["border_bins"] = int(border.size)
+        if border.size and reconcile_iterations and reconcile_iterations > 0:
+            df_solution, info["reconcile"] = self.improve_solution(df_solution, iterations=reconcile_iterations, seed=seed, bins=border)
+        return df_solution, info
+
+# ----------------------------------------
+# Parallel zone workers (optimize_hierarchical)
+# ----------------------------------------
+_ZONE_ENGINE = None
+
+def _init_zone_worker(engine):
+    global _ZONE_ENGINE
+    _ZONE_ENGINE = engine
+
+def _zone_worker(args):
+    """
+    Pool task: best-fit filling of one zone's cells with their quotas, on the
+    worker's engine copy. Returns the placements (boxes that did not fit are
+    left to the caller's fallback).
+    """
+    members, orders = args
+    rl = _ZONE_ENGINE
+    rl._reset_occupancy()
 
-# ---------------------------------
-# 9) Export builder (validator compliant)
-# ---------------------------------
-def build_validated_output(df_solution: pd.DataFrame, df_loc: pd.DataFrame, df_parts: pd.DataFrame) -> pd.DataFrame:
-    loc_idx = df_loc.set_index("loc_inst_code")
-    part_idx = df_parts.set_index("ITEM_ID")
+    placed_list = []
+    for item_id, qty, cell in orders:
+        rl._fill_bins(("cell", cell), item_id, qty, placed_list, members=members[cell])
+    return placed_list
 
-    out_rows = []
-    for _, r in df_solution.iterrows():
-        loc_id = str(r["loc_inst_code"])
-        item_id = str(r["ITEM_ID"])
-        qty = int(r["QTY_ALLOCATED"])
+# ----------------------------------------
+# Parallel partition workers (optimize_partitioned)
+# ----------------------------------------
+_PARTITION_ENGINE = None
 
-        loc_row = loc_idx.loc[loc_id]
-        part_row = part_idx.loc[item_id]
+def _init_partition_worker(engine):
+    global _PARTITION_ENGINE
+    _PARTITION_ENGINE = engine
 
-        geom_pack = geom_solve_capacity_and_layout(loc_row, part_row, qty)
-        if geom_pack is None:
-            continue
+def _partition_worker(args):
+    """
+    Pool task: optimize_from_baseline placement of one partition's quotas on its
+    own bins (+ optional local search inside the partition). Returns the placements.
+    """
+    part, members, orders, local_search_iterations, seed = args
+    rl = _PARTITION_ENGINE
+    rl._reset_occupancy()
+
+    in_part = np.zeros(len(rl.loc_ids), dtype=bool)
+    in_part[members] = True
+    zones = [idx[in_part[idx]] for idx in rl.zone_bins]
+
+    placed_list = []
+    for item_id, qty in orders:
+        rl._fill_by_zone_preference(item_id, qty, placed_list, part=(("part", part), zones, members))
+
+    if local_search_iterations > 0 and placed_list:
+        df_part, _ = rl.improve_solution(pd.DataFrame(placed_list), iterations=local_search_iterations, seed=seed, bins=members)
+        placed_list = df_part.to_dict("records")
+    return placed_list
+
+# ----------------------------------------
+# Parallel training workers (train_parallel)
+# ----------------------------------------
+_TRAIN_ENGINE = None
+
+def _init_train_worker(engine):
+    global _TRAIN_ENGINE
+    _TRAIN_ENGINE = engine
+
+def _train_worker(args):
+    """
+    Pool task: one training round on the worker's engine copy, starting from the
+    merged Q-table. Returns (Q, visits in this round, training history).
+    """
+    Q, seed_seq, episodes, alpha, epsilon, epsilon_decay, epsilon_min, strategy = args
+    rl = _TRAIN_ENGINE
+
+    worker_seed = int(seed_seq.generate_state(1)[0])
+    random.seed(worker_seed)
+    np.random.seed(worker_seed)
+
+    rl.Q = Q.copy()
+    rl.N = np.zeros_like(Q, dtype=np.int64)
+    rl.train_meta = {"episodes": 0}
+    rl.train(
+        episodes=episodes,
+        alpha=alpha,
+        epsilon=epsilon,
+        epsilon_decay=epsilon_decay,
+        epsilon_min=epsilon_min,
+        early_stop=False,
+        strategy=strategy
+    )
+    return rl.Q, rl.N, rl.training_history
+
+# ---------------------------------------------------
+# 8b) Slotting environment (multi-step, Gym-style API)
+# ---------------------------------------------------
+def default_box_queue(engine: RLRelocator, n_boxes=None):
+    """
+    One entry (ITEM_ID) per box on hand, in the optimize_from_baseline order
+    (A -> B -> C, then demand high -> low). n_boxes truncates the queue.
+    """
+    items_df = engine._items_in_fill_order()
+    queue = np.repeat(items_df["ITEM_ID"].astype(str).to_numpy(), items_df["BOXES_ON_HAND"].astype(int).to_numpy())
+    return queue[:n_boxes] if n_boxes is not None else queue
+
+
+class SlottingEnv:
+    """
+    Sequential slotting: one step places the next box of the queue.
+
+      obs = env.reset()
+      obs, reward, done, info = env.step(action_index)
+
+    - Observation: RL state of the box to place (same as RLRelocator._get_state)
+    - Action: index into engine.actions (zone Fast/Ergo combination)
+    - Bin inside the zone: same rule as optimize/train (_pick_best_bin_from_arrays)
+    - Reward: Guide placement score of the chosen bin (_score_placement terms),
+      -5.0 if no bin of the zone can take the box (box is skipped)
+
+    Occupancy is held in arrays (part index / boxes per bin) like train().
+    """
 
-        location_vol_mm3 = float(loc_row["width"] * loc_row["depth"] * loc_row["height"])
-        location_vol_m3 = location_vol_mm3 / 1e9
+    def __init__(self, engine: RLRelocator, queue=None, start_occupancy=None):
+        self.engine = engine
+        self.queue = np.asarray(queue if queue is not None else default_box_queue(engine), dtype=str)
+        self.start_occupancy = start_occupancy  # optional (occ_part, occ_qty) arrays
 
-        orient_vol_mm3 = geom_pack["ORIENT_X_MM"] * geom_pack["ORIENT_Y_MM"] * geom_pack["ORIENT_Z_MM"]
-        stored_vol_mm3 = qty * orient_vol_mm3
-        stored_vol_m3 = stored_vol_mm3 / 1e9
+        n_bins = len(engine.loc_ids)
+        self.occ_part = np.full(n_bins, -1, dtype=np.int64)
+        self.occ_qty = np.zeros(n_bins, dtype=np.int64)
+        self.t = 0
 
-        util_pct = (stored_vol_mm3 / location_vol_mm3) * 100.0 if location_vol_mm3 > 0 else 0.0
+    def _obs(self):
+        if self.t >= len(self.queue):
+            return None
+        return self.engine._get_state(self.queue[self.t])
+
+    def reset(self):
+        if self.start_occupancy is not None:
+            self.occ_part[:] = self.start_occupancy[0]
+            self.occ_qty[:] = self.start_occupancy[1]
+        else:
+            self.occ_part.fill(-1)
+            self.occ_qty.fill(0)
+        self.t = 0
+        return self._obs()
+
+    def step(self, action: int):
+        if self.t >= len(self.queue):
+            raise RuntimeError("Episode finished. Call reset().")
+
+        item_id = self.queue[self.t]
+        best = self.engine._pick_best_bin_from_arrays(
+            item_id, self.engine.actions[int(action)], self.occ_part, self.occ_qty
+        )
+
+        if best is None:
+            reward, loc_id = -5.0, None
+        else:
+            b, reward = best
+            self.occ_part[b] = self.engine.part_pos[item_id]
+            self.occ_qty[b] += 1
+            loc_id = str(self.engine.loc_ids[b])
+
+        self.t += 1
+        done = self.t >= len(self.queue)
+        return self._obs(), float(reward), done, {"item_id": item_id, "loc_id": loc_id}
+
+
+class VecSlottingEnv:
+    """
+    n_envs copies of SlottingEnv stepped together: candidate selection and
+    scoring for all copies is one batch of array operations (occupancy is
+    (n_envs, n_bins)). Copies run the same queue unless `shuffle` gives each
+    its own order (seeded by `seed`).
 
-        out_rows.append({
-            "loc_inst_code": loc_id,
-            "LOCATION_TYPE": str(loc_row.get("LOCATION_TYPE", "BIN")),
-            "ITEM_ID": item_id,
-            "QTY_ALLOCATED": int(qty),
+      obs = venv.reset()                      # (n_envs,) state codes (-1 when finished)
+      obs, rewards, dones, infos = venv.step(actions)   # actions: (n_envs,) ints
 
-            "MAX_UNITS": int(geom_pack["MAX_UNITS"]),
-            "GRID_X": int(geom_pack["GRID_X"]),
-            "GRID_Y": int(geom_pack["GRID_Y"]),
-            "GRID_Z": int(geom_pack["GRID_Z"]),
-            "FULL_LAYERS": int(geom_pack["FULL_LAYERS"]),
-            "PARTIAL_UNITS": int(geom_pack["PARTIAL_UNITS"]),
+    All copies share one time step and one queue length (shuffle only reorders the
+    boxes), so they finish together: dones is all True after the last box, and
+    step() raises until reset().
+    """
 
-            "ORIENT_X_MM": float(geom_pack["ORIENT_X_MM"]),
-            "ORIENT_Y_MM": float(geom_pack["ORIENT_Y_MM"]),
-            "ORIENT_Z_MM": float(geom_pack["ORIENT_Z_MM"]),
+    def __init__(self, engine: RLRelocator, n_envs: int, queue=None, shuffle=False, seed=None):
+        self.engine = engine
+        self.n_envs = int(n_envs)
+        base = np.asarray(queue if queue is not None else default_box_queue(engine), dtype=str)
+        self.rng = np.random.default_rng(seed)
 
-            "LOCATION_VOL_MM3": float(location_vol_mm3),
-            "LOCATION_VOL_M3": float(location_vol_m3),
-            "STORED_VOL_M3": float(stored_vol_m3),
-            "UTILIZATION_PCT": float(util_pct),
-        })
+        if shuffle:
+            self.queues = np.stack([self.rng.permutation(base) for _ in range(self.n_envs)])
+        else:
+            self.queues = np.tile(base, (self.n_envs, 1))
+        self.queue_parts = np.vectorize(engine.part_pos.__getitem__, otypes=[np.int64])(self.queues) if base.size else np.zeros((self.n_envs, 0), dtype=np.int64)
+
+        n_bins = len(engine.loc_ids)
+        self.occ_part = np.full((self.n_envs, n_bins), -1, dtype=np.int64)
+        self.occ_qty = np.zeros((self.n_envs, n_bins), dtype=np.int64)
+        self.occ_vol = np.full((self.n_envs, n_bins), np.nan)  # assigned unit volume (affinity)
+        self.t = 0
+
+    def _obs(self):
+        if self.t >= self.queues.shape[1]:
+            return np.full(self.n_envs, -1, dtype=np.int64)
+        return self.engine.part_state[self.queue_parts[:, self.t]]
+
+    def reset(self):
+        self.occ_part.fill(-1)
+        self.occ_qty.fill(0)
+        self.occ_vol.fill(np.nan)
+        self.t = 0
+        return self._obs()
+
+    def step(self, actions):
+        if self.t >= self.queues.shape[1]:
+            raise RuntimeError("Episode finished. Call reset().")
+
+        rl = self.engine
+        rows = np.arange(self.n_envs)
+        parts = self.queue_parts[:, self.t]
+        actions = np.asarray(actions, dtype=np.int64)
+
+        # Allowed bins per copy: every bin of its zone holding the same SKU or empty
+        bins = rl.zone_pad[actions]
+        in_zone = bins >= 0
+        bins = np.where(in_zone, bins, 0)
+        cur = np.take_along_axis(self.occ_part, bins, axis=1)
+
+        qty_after = np.take_along_axis(self.occ_qty, bins, axis=1) + 1  # BOX-LEVEL
+        cap_rows = np.stack([rl._capacity_row(item_id) for item_id in self.queues[:, self.t]])
+        cap = np.take_along_axis(cap_rows, bins, axis=1)
+        ok = in_zone & ((cur == parts[:, None]) | (cur < 0)) & (cap > 0) & (qty_after <= cap)
+
+        # Best-first bound (see RLRelocator._select_best): only the feasible bins with the
+        # best (util_after, dist) of each copy can win, so only those are fully scored
+        util = rl._util_after(parts[:, None], bins, qty_after)
+        dist = rl.bin_dist[bins]
+        lead = ok & (util == np.where(ok, util, -np.inf).max(axis=1, keepdims=True))
+        lead &= dist == np.where(lead, dist, np.inf).min(axis=1, keepdims=True)
+
+        r, j = np.nonzero(lead)
+        b = bins[r, j]
+        ok_l, _, _, aff, score = rl._score_arrays(parts[r], b, qty_after[r, j], self.occ_vol, cap[r, j], rows=r)
+        ok_l &= score > -9999
+
+        # MINIMIZE (infeasible, -affinity, -score, loc_id) inside each copy's group
+        o = np.lexsort((rl.bin_id_rank[b], -score, -aff, ~ok_l, r))
+        first = o[np.unique(r[o], return_index=True)[1]]
+
+        placed = np.zeros(self.n_envs, dtype=bool)
+        placed[r[first]] = ok_l[first]
+        best_bin = np.full(self.n_envs, -1, dtype=np.int64)
+        best_bin[r[first]] = b[first]
+        best_score = np.zeros(self.n_envs)
+        best_score[r[first]] = score[first]
+
+        rewards = np.where(placed, best_score, -5.0)
+        self.occ_part[rows[placed], best_bin[placed]] = parts[placed]
+        self.occ_vol[rows[placed], best_bin[placed]] = rl.part_vol[parts[placed]]
+        self.occ_qty[rows[placed], best_bin[placed]] += 1
+
+        self.t += 1
+        done = self.t >= self.queues.shape[1]
+        dones = np.full(self.n_envs, done)
+        infos = {"placed": placed, "bin_index": np.where(placed, best_bin, -1)}
+        return self._obs(), rewards, dones, infos
 
-    out = pd.DataFrame(out_rows)
+# ---------------------------------
+# 9) Export builder (validator compliant)
+# ---------------------------------
+OUTPUT_COLUMNS = [
+    "loc_inst_code", "LOCATION_TYPE", "ITEM_ID", "QTY_ALLOCATED",
+    "MAX_UNITS", "GRID_X", "GRID_Y", "GRID_Z", "FULL_LAYERS", "PARTIAL_UNITS",
+    "ORIENT_X_MM", "ORIENT_Y_MM", "ORIENT_Z_MM",
+    "LOCATION_VOL_MM3", "LOCATION_VOL_M3", "STORED_VOL_M3", "UTILIZATION_PCT",
+]
 
-    # Hard enforce single row per bin
-    out = out.sort_values("loc_inst_code").drop_duplicates(subset=["loc_inst_code"], keep="first").copy()
+def geom_layout_vectorized(loc_dims: np.ndarray, sku_dims: np.ndarray):
+    """
+    Vectorized compute_layered_capacity with orientation and grid, one row per (bin, SKU) pair.
+      loc_dims, sku_dims: (n, 3)
+    Returns (max_units (n,), orientation (n, 3), grid (n, 3)); max_units = 0 where nothing fits.
+    First best orientation in permutation order wins, as in compute_layered_capacity.
+    """
+    loc_dims = np.asarray(loc_dims, dtype=float)
+    sku = np.asarray(sku_dims, dtype=float)
+    safe = np.where(sku > 0, sku, 1.0)
+    fits = np.floor_divide(loc_dims[:, :, None], safe[:, None, :]).astype(np.int64)
+    fits[~np.all(sku > 0, axis=1)] = 0
+
+    perms = np.array(_ORIENT_PERMS)
+    grids = np.stack([fits[:, 0, perms[:, 0]], fits[:, 1, perms[:, 1]], fits[:, 2, perms[:, 2]]], axis=2)  # (n, 6, 3)
+    totals = grids.prod(axis=2)
+    best = np.argmax(totals, axis=1)
+
+    rows = np.arange(len(loc_dims))
+    max_units = totals[rows, best]
+    orient = sku[rows[:, None], perms[best]]
+    grid = grids[rows, best]
+    return max_units, orient, grid
 
-    # Enforce grid math
-    out["MAX_UNITS"] = (out["GRID_X"] * out["GRID_Y"] * out["GRID_Z"]).astype(int)
+def build_validated_output(df_solution: pd.DataFrame, df_loc: pd.DataFrame, df_parts: pd.DataFrame) -> pd.DataFrame:
+    """
+    Validator-compliant allocation table. The solution is joined to locations and
+    parts once and geometry is computed for all rows in one vectorized pass.
+    Rows whose quantity does not fit are dropped; one row per bin is kept
+    (first ITEM_ID in loc_inst_code order).
+    """
+    if df_solution is None or df_solution.empty:
+        return pd.DataFrame(columns=OUTPUT_COLUMNS)
+
+    sol = pd.DataFrame({
+        "loc_inst_code": df_solution["loc_inst_code"].astype(str).to_numpy(),
+        "ITEM_ID": df_solution["ITEM_ID"].astype(str).to_numpy(),
+        "QTY_ALLOCATED": df_solution["QTY_ALLOCATED"].astype(np.int64).to_numpy(),
+    })
+
+    loc_idx = df_loc.assign(loc_inst_code=df_loc["loc_inst_code"].astype(str)).set_index("loc_inst_code")
+    part_idx = df_parts.assign(ITEM_ID=df_parts["ITEM_ID"].astype(str)).set_index("ITEM_ID")
+
+    loc_pos = loc_idx.index.get_indexer(sol["loc_inst_code"])
+    part_pos = part_idx.index.get_indexer(sol["ITEM_ID"])
+    if (loc_pos < 0).any():
+        raise KeyError(f"Unknown loc_inst_code in solution: {sorted(set(sol.loc[loc_pos < 0, 'loc_inst_code']))[:5]}")
+    if (part_pos < 0).any():
+        raise KeyError(f"Unknown ITEM_ID in solution: {sorted(set(sol.loc[part_pos < 0, 'ITEM_ID']))[:5]}")
+
+    loc_dims = loc_idx[["width", "depth", "height"]].to_numpy(dtype=float)[loc_pos]
+    sku_dims = part_idx[["LEN_MM", "WID_MM", "DEP_MM"]].to_numpy(dtype=float)[part_pos]
+    qty = sol["QTY_ALLOCATED"].to_numpy()
+
+    max_units, orient, grid = geom_layout_vectorized(loc_dims, sku_dims)
+
+    # Feasible rows only, then single row per bin (sorted by bin, first row kept)
+    keep = (max_units > 0) & (qty <= max_units)
+    order = np.flatnonzero(keep)
+    order = order[np.argsort(sol["loc_inst_code"].to_numpy()[order], kind="stable")]
+    order = order[~pd.Index(sol["loc_inst_code"].to_numpy()[order]).duplicated(keep="first")]
+
+    loc_dims, orient, grid, qty = loc_dims[order], orient[order], grid[order], qty[order]
+
+    if "LOCATION_TYPE" in loc_idx.columns:
+        location_type = loc_idx["LOCATION_TYPE"].astype(str).to_numpy()[loc_pos[order]]
+    else:
+        location_type = np.full(len(order), "BIN", dtype=object)
+
+    units_per_layer = grid[:, 0] * grid[:, 1]
+    location_vol_mm3 = loc_dims[:, 0] * loc_dims[:, 1] * loc_dims[:, 2]
+    orient_vol_mm3 = orient[:, 0] * orient[:, 1] * orient[:, 2]
+    stored_vol_mm3 = qty * orient_vol_mm3
+    with np.errstate(divide="ignore", invalid="ignore"):
+        util_pct = np.where(location_vol_mm3 > 0, (stored_vol_mm3 / location_vol_mm3) * 100.0, 0.0)
+
+    out = pd.DataFrame({
+        "loc_inst_code": sol["loc_inst_code"].to_numpy()[order],
+        "LOCATION_TYPE": location_type,
+        "ITEM_ID": sol["ITEM_ID"].to_numpy()[order],
+        "QTY_ALLOCATED": qty.astype(int),
+
+        # Enforce grid math
+        "MAX_UNITS": (grid[:, 0] * grid[:, 1] * grid[:, 2]).astype(int),
+        "GRID_X": grid[:, 0].astype(int),
+        "GRID_Y": grid[:, 1].astype(int),
+        "GRID_Z": grid[:, 2].astype(int),
+        "FULL_LAYERS": (qty // units_per_layer).astype(int),
+        "PARTIAL_UNITS": (qty % units_per_layer).astype(int),
+
+        "ORIENT_X_MM": orient[:, 0],
+        "ORIENT_Y_MM": orient[:, 1],
+        "ORIENT_Z_MM": orient[:, 2],
+
+        "LOCATION_VOL_MM3": location_vol_mm3,
+        "LOCATION_VOL_M3": location_vol_mm3 / 1e9,
+        "STORED_VOL_M3": stored_vol_mm3 / 1e9,
+        "UTILIZATION_PCT": util_pct,
+    })
 
     return out
 
@@ -902,6 +2553,10 @@ def build_validated_output(df_solution: pd.DataFrame, df_loc: pd.DataFrame, df_p
 # 10) Main runner (same required flow)
 # -----------------------------------
 def main():
+    random.seed(SEED)
+    np.random.seed(SEED)
+    clear_geom_cache()
+
     print("Loading input files from Colab working directory...")
 
     df_loc_raw   = read_csv_semicolon_if_needed(LOCATIONS_FILE)
@@ -933,7 +2588,7 @@ def main():
     # Baseline dashboard
     print("\n[Dashboard] Generating Baseline (Input) dashboard...")
     try:
-        _ = VIZ.generate_dashboard(df_alloc_raw, df_loc_raw, df_parts_raw, title="Baseline (Input)")
+        _ = load_viz().generate_dashboard(df_alloc_raw, df_loc_raw, df_parts_raw, title="Baseline (Input)")
     except Exception as e:
         print(f"[Info] Baseline dashboard skipped (schema mismatch is OK): {e}")
 
@@ -947,17 +2602,56 @@ def main():
         max_dist_possible=max_dist_possible,
         max_x_dim=max_x_dim
     )
-    rl.train(
-        episodes=6000,
-        alpha=0.25,
-        epsilon=1.0,
-        epsilon_decay=0.996,
-        epsilon_min=0.06
-    )
+    if Q_TABLE_FILE and os.path.exists(Q_TABLE_FILE):
+        meta = rl.warm_start(Q_TABLE_FILE, refresh_episodes=REFRESH_EPISODES, strategy=TRAIN_STRATEGY)
+        print(f"Warm start from {Q_TABLE_FILE} ({meta.get('episodes', 0)} episodes) + {REFRESH_EPISODES} refresh episodes")
+    elif TRAIN_WORKERS > 1:
+        rl.train_parallel(episodes=TRAIN_EPISODES, n_workers=TRAIN_WORKERS, seed=SEED, strategy=TRAIN_STRATEGY)
+    else:
+        rl.train(
+            episodes=TRAIN_EPISODES,
+            alpha=0.25,
+            epsilon=1.0,
+            epsilon_decay=0.996,
+            epsilon_min=0.06,
+            strategy=TRAIN_STRATEGY
+        )
+    if Q_TABLE_FILE:
+        rl.save_q_table(Q_TABLE_FILE)
+        print(f"[OK] Saved Q-table to: {Q_TABLE_FILE}")
+
+    hist = rl.training_history
+    summary = summarize_training(hist)
+    print(f"Training episodes run: {summary['episodes']} (converged early: {rl.train_meta.get('converged', False)}, "
+          f"95% of final avg reward after {summary['episodes_to_level']} episodes)")
+    try:
+        plot_training_history(hist)
+    except Exception as e:
+        print(f"[Info] Training curve skipped: {e}")
 
     # Optimize (BOX-LEVEL)
     print("\nGenerating optimized allocation (BOX-LEVEL, single SKU per bin, SKU can span bins)...")
-    df_solution = rl.optimize_from_baseline()
+    if HIERARCHICAL_OPTIMIZER:
+        df_solution, h_info = rl.optimize_hierarchical()
+        print(f"  hierarchical: {h_info['zones']} zones / {h_info['cells']} cells, {h_info['workers']} workers, "
+              f"{h_info['overflow_boxes']} boxes via global fallback")
+    elif PARTITION_WORKERS > 1:
+        # Local search runs inside the partitions (in parallel), then on the partition borders
+        df_solution, p_info = rl.optimize_partitioned(
+            n_workers=PARTITION_WORKERS, local_search_iterations=LOCAL_SEARCH_ITERATIONS, seed=SEED
+        )
+        print(f"  partitioned: {p_info['partitions']} partitions, {p_info['workers']} workers, "
+              f"{p_info['overflow_boxes']} boxes via global fallback, {p_info['border_bins']} border bins")
+    else:
+        df_solution = rl.optimize_from_baseline()
+
+    if LOCAL_SEARCH_ITERATIONS and LOCAL_SEARCH_ITERATIONS > 0 and PARTITION_WORKERS <= 1:
+        print(f"Local search post-optimization ({LOCAL_SEARCH_ITERATIONS} moves)...")
+        df_solution, ls_info = rl.improve_solution(
+            df_solution, iterations=LOCAL_SEARCH_ITERATIONS, time_budget=LOCAL_SEARCH_SECONDS, seed=SEED
+        )
+        print(f"  avg Guide score per bin: {ls_info['avg_score_before']:.1f} -> {ls_info['avg_score_after']:.1f} "
+              f"({ls_info['accepted']} of {ls_info['iterations']} moves accepted)")
 
     # Coverage info (now compares total boxes)
     parts_pos = df_parts[df_parts["BOXES_ON_HAND"] > 0][["ITEM_ID", "BOXES_ON_HAND"]].copy()
@@ -995,125 +2689,58 @@ def main():
         df_parts_raw_dash = df_parts_raw.copy()
         df_parts_raw_dash["ITEM_ID"] = df_parts_raw_dash["ITEM_ID"].astype(str)
 
-        _ = VIZ.generate_dashboard(df_out_dash, df_loc_raw, df_parts_raw_dash, title="RL Optimized (Output)")
+        _ = load_viz().generate_dashboard(df_out_dash, df_loc_raw, df_parts_raw_dash, title="RL Optimized (Output)")
     except Exception as e:
         print(f"[Warn] Optimized dashboard failed: {e}")
         print("This does NOT affect validation output CSV correctness.")
 
     print("\nDone.")
 
-if __name__ == "__main__":
-    main()
-
-import importlib.util
-import matplotlib.pyplot as plt
-
-# 1) Load the final engine
-spec = importlib.util.spec_from_file_location("rl_engine_final", "/content/rl_engine_final.py")
-rlmod = importlib.util.module_from_spec(spec)
-spec.loader.exec_module(rlmod)
-
-# 2) Monkey-patch train() to record reward per episode
-orig_train = rlmod.RLRelocator.train  # keep original
-
-def train_with_history(self, episodes=6000, alpha=0.25, epsilon=1.0, epsilon_decay=0.996, epsilon_min=0.06):
-    items = self.parts[self.parts["BOXES_ON_HAND"] > 0]["ITEM_ID"].astype(str).tolist()
-    if not items:
-        raise ValueError("No items with BOXES_ON_HAND > 0. Cannot train.")
-
-    loc_ids = self.loc["loc_inst_code"].astype(str).tolist()
-    history = []
-
-    for ep in range(int(episodes)):
-        item_id = str(random.choice(items))
-        state = self._get_state(item_id)
-
-        # epsilon-greedy zone action
-        if random.random() < epsilon:
-            a_idx = random.randrange(len(self.actions))
-        else:
-            a_idx = int(np.argmax(self._Q_row(state)))
-        action = self.actions[a_idx]
-
-        # random occupancy snapshot (single SKU per bin)
-        bin_sku_map = {l: None for l in loc_ids}
-        bin_qty_map = {l: 0 for l in loc_ids}
-
-        occ_n = max(0, int(0.15 * len(loc_ids)))
-        occ_bins = random.sample(loc_ids, k=occ_n)
-
-        for b in occ_bins:
-            sku = str(random.choice(items))
-            if bin_sku_map[b] is not None:
-                continue
-
-            loc_row = self.loc_dict[str(b)] if hasattr(self, "loc_dict") else self.loc_idx.loc[str(b)]
-            part_row = self.part_dict[str(sku)] if hasattr(self, "part_dict") else self.part_idx.loc[str(sku)]
-
-            if bool(part_row["IS_HEAVY"]) and float(loc_row["z"]) > 1500.0:
-                continue
-
-            geom1 = geom_solve_capacity_and_layout(loc_row, part_row, qty=1)
-            if geom1 is None:
-                continue
-
-            max_units = int(geom1["MAX_UNITS"])
-            if max_units <= 0:
-                continue
-
-            qty = random.randint(1, min(3, max_units))
-            bin_sku_map[b] = sku
-            bin_qty_map[b] = qty
-
-        best = self._pick_best_bin_for_action(item_id, action, bin_sku_map, bin_qty_map, search_cap=180)
-
-        q = self._Q_row(state)[a_idx]
-        if best is None:
-            reward = -5.0
-            self._Q_row(state)[a_idx] = q + alpha * (reward - q)
-        else:
-            _, _, reward = best
-            self._Q_row(state)[a_idx] = q + alpha * (reward - q)
-
-        history.append(float(reward))
-        epsilon = max(epsilon_min, epsilon * epsilon_decay)
-
-    self.training_history = history
-    return self.Q
-
-# Replace train at runtime (file stays unchanged)
-rlmod.RLRelocator.train = train_with_history
-
-print("Patched: RLRelocator.train now records training_history (file unchanged).")
-
-df_loc_raw   = read_csv_semicolon_if_needed(LOCATIONS_FILE)
-df_parts_raw = read_csv_semicolon_if_needed(PARTS_FILE)
-df_alloc_raw = read_csv_semicolon_if_needed(ALLOC_BASELINE_FILE)
-
-df_loc   = normalize_locations(df_loc_raw)
-df_parts = normalize_parts(df_parts_raw)
-df_alloc_baseline = normalize_allocations_baseline(df_alloc_raw)
+def summarize_training(history: dict, window: int = 250, level: float = 0.95) -> dict:
+    """
+    Compares training runs (e.g. strategies): episodes run, final moving-average
+    reward, and the first episode where the moving average reached `level` of it.
+    """
+    hist = np.asarray(history["reward"], dtype=float)
+    if hist.size == 0:
+        return {"episodes": 0, "final_avg_reward": float("nan"), "episodes_to_level": None}
 
-df_parts = apply_dynamic_abc(df_parts)
-df_loc, entrance, max_dist_possible, max_x_dim = build_guide_zones(df_loc)
+    w = max(1, min(int(window), hist.size))
+    ma = np.convolve(hist, np.ones(w) / w, mode="valid")
+    final = float(ma[-1])
+    target = final - (1.0 - level) * abs(final)
+    reached = np.flatnonzero(ma >= target)
 
-rl = rlmod.RLRelocator(df_parts, df_loc, df_alloc_baseline, entrance, max_dist_possible, max_x_dim)
-rl.train(episodes=6000, alpha=0.25, epsilon=1.0, epsilon_decay=0.996, epsilon_min=0.06)
+    return {
+        "episodes": int(hist.size),
+        "final_avg_reward": final,
+        "episodes_to_level": int(reached[0] + w) if reached.size else None,
+    }
 
-# 4) Plot training curve
-hist = rl.training_history
-window = 50
-smooth = [
-    sum(hist[max(0, i-window+1):i+1]) / len(hist[max(0, i-window+1):i+1])
-    for i in range(len(hist))
-]
+def plot_training_history(history: dict, window: int = 50):
+    """
+    Plots per-episode reward (raw + moving average) from RLRelocator.training_history.
+    """
+    import matplotlib.pyplot as plt
+
+    hist = np.asarray(history["reward"], dtype=float)
+    if hist.size == 0:
+        return
+
+    csum = np.cumsum(np.insert(hist, 0, 0.0))
+    idx = np.arange(1, hist.size + 1)
+    start = np.maximum(0, idx - window)
+    smooth = (csum[idx] - csum[start]) / (idx - start)
+
+    plt.figure(figsize=(10,4))
+    plt.plot(hist, alpha=0.2, label="Reward (raw)")
+    plt.plot(smooth, label=f"Reward (moving avg, window={window})")
+    plt.title("RL Training Progress (per-episode reward)")
+    plt.xlabel("Episode")
+    plt.ylabel("Reward")
+    plt.legend()
+    plt.grid(alpha=0.3)
+    plt.show()
 
-plt.figure(figsize=(10,4))
-plt.plot(hist, alpha=0.2, label="Reward (raw)")
-plt.plot(smooth, label=f"Reward (moving avg, window={window})")
-plt.title("RL Training Progress (per-episode reward)")
-plt.xlabel("Episode")
-plt.ylabel("Reward")
-plt.legend()
-plt.grid(alpha=0.3)
-plt.show()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -116,6 +116,27 @@ def _calculate_manhattan_distances(df):
     
     return df, max_dist_possible, max_x
 
+def _calculate_affinity_rewards(df, indptr, indices):
+    """
+    +50 for every occupied bin with a neighbor holding a SKU whose unit volume
+    is within +-15% of its own. Needs UNIT_VOL_MM3 (see prepare_unified_dataframe).
+    """
+    if 'UNIT_VOL_MM3' not in df.columns or df.empty:
+        return np.zeros(len(df))
+
+    occupied = (df['utilization'] > 0) & df['SKU'].notna() if 'SKU' in df.columns else df['utilization'] > 0
+    vol = np.where(occupied.to_numpy(), pd.to_numeric(df['UNIT_VOL_MM3'], errors='coerce').to_numpy(dtype=float), np.nan)
+
+    # One entry per (bin, neighbor) pair
+    deg = np.diff(indptr)
+    owner = np.repeat(np.arange(len(df)), deg)
+    own_v = vol[owner]
+    nbr_v = vol[indices]
+    hit = (nbr_v >= 0.85 * own_v) & (nbr_v <= 1.15 * own_v)
+
+    has_aff = np.bincount(owner[hit], minlength=len(df)) > 0
+    return np.where(has_aff, 50.0, 0.0)
+
 def _calculate_detailed_scores(df, max_dist_possible, max_x_dim):
     """
     Implements the Scoring Logic V2.
@@ -124,6 +145,7 @@ def _calculate_detailed_scores(df, max_dist_possible, max_x_dim):
     df['Reward_Zone'] = 0.0
     df['Reward_Util'] = 0.0
     df['Penalty_Dist'] = 0.0
+    df['Reward_Affinity'] = 0.0
     df['Total_Score'] = 0.0
     df['Violation_Flag'] = False
     
@@ -172,12 +194,21 @@ def _calculate_detailed_scores(df, max_dist_possible, max_x_dim):
     df['Penalty_Dist'] = (df['dist_manhattan'] / max_dist_possible) * -100.0
     
     # D. Affinity Reward (+50)
-    # Placeholder: 0.0 (Requires neighbor graph)
+    # Neighbor (same row & level, adjacent bay) holds a SKU with unit volume within +-15%
+    # Needs warehouse_geom and UNIT_VOL_MM3, stays 0 without them
+    if 'UNIT_VOL_MM3' in df.columns:
+        try:
+            from warehouse_geom import build_neighbor_csr
+        except ImportError:
+            build_neighbor_csr = None
+        if build_neighbor_csr is not None:
+            indptr, indices = build_neighbor_csr(df)
+            df['Reward_Affinity'] = _calculate_affinity_rewards(df, indptr, indices)
     
     # ---------------------------------------------------------
     # 4. Total Score
     # ---------------------------------------------------------
-    df['Total_Score'] = df['Reward_Zone'] + df['Reward_Util'] + df['Penalty_Dist']
+    df['Total_Score'] = df['Reward_Zone'] + df['Reward_Util'] + df['Penalty_Dist'] + df['Reward_Affinity']
     
     # Apply Hard Penalty Override
     df.loc[df['violation_weight'], 'Total_Score'] = -10000.0
@@ -201,7 +232,12 @@ def prepare_unified_dataframe(df_alloc_raw, df_locations, df_items=None):
     
     # 2. Merge Items
     if df_items is not None and 'SKU' in df.columns:
-        df = pd.merge(df, df_items[['ITEM_ID', 'DEMAND', 'WT_KG']], left_on='SKU', right_on='ITEM_ID', how='left')
+        item_cols = ['ITEM_ID', 'DEMAND', 'WT_KG']
+        if {'LEN_MM', 'WID_MM', 'DEP_MM'}.issubset(df_items.columns):
+            df_items = df_items.copy()
+            df_items['UNIT_VOL_MM3'] = df_items['LEN_MM'] * df_items['WID_MM'] * df_items['DEP_MM']
+            item_cols.append('UNIT_VOL_MM3')
+        df = pd.merge(df, df_items[item_cols], left_on='SKU', right_on='ITEM_ID', how='left')
         df['DEMAND'] = df['DEMAND'].fillna(0)
         df['WT_KG'] = df['WT_KG'].fillna(0)
     else:
@@ -254,8 +290,9 @@ def calculate_warehouse_stats(df):
         avg_score_zone = occupied_df['Reward_Zone'].mean()
         avg_score_util = occupied_df['Reward_Util'].mean()
         avg_score_dist = occupied_df['Penalty_Dist'].mean()
+        avg_score_aff = occupied_df['Reward_Affinity'].mean()
     else:
-        avg_score_total = 0; avg_score_zone = 0; avg_score_util = 0; avg_score_dist = 0
+        avg_score_total = 0; avg_score_zone = 0; avg_score_util = 0; avg_score_dist = 0; avg_score_aff = 0
 
     stats = {
         "Weight Violations": int(weight_vios),
@@ -269,7 +306,8 @@ def calculate_warehouse_stats(df):
         "Avg Combined Score": avg_score_total,
         "Avg Zone Reward": avg_score_zone,
         "Avg Util Reward": avg_score_util,
-        "Avg Dist Penalty": avg_score_dist
+        "Avg Dist Penalty": avg_score_dist,
+        "Avg Affinity Reward": avg_score_aff
     }
     return stats
 
@@ -287,6 +325,7 @@ def _print_stats(stats, title):
     print(f"{'  > Zone Reward':<25}: {stats.get('Avg Zone Reward',0):.1f}")
     print(f"{'  > Util Reward':<25}: {stats.get('Avg Util Reward',0):.1f}")
     print(f"{'  > Dist Penalty':<25}: {stats.get('Avg Dist Penalty',0):.1f}")
+    print(f"{'  > Affinity Reward':<25}: {stats.get('Avg Affinity Reward',0):.1f}")
     print("")
     
     u_avg = stats.get("Avg Util (Occupied)", 0)
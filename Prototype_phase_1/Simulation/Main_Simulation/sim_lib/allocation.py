@@ -7,7 +7,7 @@ from .geometry import (
     build_actual_matrix,)
 
 
-def _cached_capacity(loc, sku, fit_cache):
+def cached_capacity(loc, sku, fit_cache):
     """
     Cache key: (LOCATION_ID, ITEM_ID)
     Cache value: (max_units, best_orientation, best_grid)
@@ -117,7 +117,7 @@ def assign_initial_stock(
                 if loc["ASSIGNED_SKU"] is not None:
                     continue
 
-                max_units, orientation, grid = _cached_capacity(loc, sku, fit_cache)
+                max_units, orientation, grid = cached_capacity(loc, sku, fit_cache)
                 if max_units > 0:
                     feasible_locs.append((loc, max_units, orientation, grid))
 
@@ -178,7 +178,7 @@ def assign_initial_stock(
         for _ in range(int(max_random_tries_per_location)):
             sku = random.choice(parts)
 
-            max_units, orientation, grid = _cached_capacity(loc, sku, fit_cache)
+            max_units, orientation, grid = cached_capacity(loc, sku, fit_cache)
             if max_units <= 0:
                 continue
 
@@ -213,7 +213,7 @@ def assign_initial_stock(
             random.shuffle(shuffled_parts)
 
             for sku in shuffled_parts:
-                max_units, orientation, grid = _cached_capacity(loc, sku, fit_cache)
+                max_units, orientation, grid = cached_capacity(loc, sku, fit_cache)
                 if max_units <= 0:
                     continue
 
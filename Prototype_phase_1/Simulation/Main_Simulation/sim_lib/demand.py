@@ -19,18 +19,26 @@ def sample_demand(mean, abc_class):
     return qty
 
 
-def get_reorder_params(abc_class, max_capacity):
+# (reorder point, order-up-to target) as fractions of SKU capacity
+REORDER_FRACTIONS = {
+    "A": (0.5, 0.9),
+    "B": (0.4, 0.8),
+    "C": (0.3, 0.7),
+}
+
+
+def get_reorder_params(abc_class, max_capacity, fractions=None):
+    """
+    Reorder point and target for a SKU. `fractions` = (rp_frac, target_frac)
+    overrides the ABC defaults (e.g. a policy found by optimize_reorder_params).
+    """
     if max_capacity <= 0:
         return 0, 0
-    if abc_class == "A":
-        rp = int(0.5 * max_capacity)
-        target = int(0.9 * max_capacity)
-    elif abc_class == "B":
-        rp = int(0.4 * max_capacity)
-        target = int(0.8 * max_capacity)
-    else:
-        rp = int(0.3 * max_capacity)
-        target = int(0.7 * max_capacity)
+    if fractions is None:
+        fractions = REORDER_FRACTIONS.get(abc_class, REORDER_FRACTIONS["C"])
+    rp_frac, target_frac = fractions
+    rp = int(rp_frac * max_capacity)
+    target = int(target_frac * max_capacity)
     return rp, target
 
 
@@ -40,3 +48,106 @@ def sample_lead_time(abc_class):
     lt = int(max(1, round(np.random.normal(5.0, 3.5))))
     return lt
 
+
+class DemandSampler:
+    """
+    Vectorized demand sampler (same distributions as sample_demand).
+
+    SKUs are grouped by ABC class once; every draw is one RNG call per
+    distribution for the whole block (normal for A, gamma for B, exponential
+    for C) instead of one call per SKU per period.
+
+    Usage:
+      sampler = DemandSampler.from_sku_state(sku_state, seed=42)
+      demand = sampler.draw(36)            # int (periods, n_skus), columns = sampler.item_ids
+      kpi = run_simulation(sku_state, months=36, sampler=sampler)
+
+    A fixed seed gives reproducible blocks (benchmarking).
+    """
+
+    def __init__(self, mean_demand, abc_classes, item_ids=None, seed=None):
+        self.mean = np.asarray(mean_demand, dtype=float)
+        abc = np.asarray(abc_classes).astype(str)
+        self.item_ids = list(item_ids) if item_ids is not None else list(range(len(self.mean)))
+        self.rng = np.random.default_rng(seed)
+
+        self.idx_a = np.flatnonzero(abc == "A")
+        self.idx_b = np.flatnonzero(abc == "B")
+        self.idx_c = np.flatnonzero((abc != "A") & (abc != "B"))
+        self.zero_demand = self.mean <= 0
+
+        # Distribution parameters per group (0-mean SKUs are masked after drawing)
+        safe_mean = np.where(self.zero_demand, 1.0, self.mean)
+        self.mean_a = safe_mean[self.idx_a]
+        self.mean_b = safe_mean[self.idx_b]
+        self.mean_c = safe_mean[self.idx_c]
+
+    @classmethod
+    def from_sku_state(cls, sku_state, seed=None):
+        item_ids = list(sku_state.keys())
+        return cls(
+            [sku_state[i]["mean_demand"] for i in item_ids],
+            [sku_state[i]["ABC"] for i in item_ids],
+            item_ids=item_ids,
+            seed=seed,
+        )
+
+    def __len__(self):
+        return len(self.mean)
+
+    def draw_block(self, replications, periods):
+        """
+        Returns:
+          int array (replications, periods, n_skus)
+        """
+        lead = (int(replications), int(periods))
+        vals = np.zeros(lead + (len(self.mean),), dtype=float)
+
+        if self.idx_a.size:
+            vals[:, :, self.idx_a] = self.rng.normal(
+                loc=self.mean_a, scale=0.2 * self.mean_a, size=lead + (self.idx_a.size,)
+            )
+        if self.idx_b.size:
+            vals[:, :, self.idx_b] = self.rng.gamma(2.0, self.mean_b / 2.0, size=lead + (self.idx_b.size,))
+        if self.idx_c.size:
+            vals[:, :, self.idx_c] = self.rng.exponential(scale=self.mean_c, size=lead + (self.idx_c.size,))
+
+        demand = np.maximum(0, np.round(vals)).astype(np.int64)
+        demand[:, :, self.zero_demand] = 0
+        return demand
+
+    def draw(self, periods):
+        """
+        Returns:
+          int array (periods, n_skus)
+        """
+        return self.draw_block(1, periods)[0]
+
+    def draw_lead_times(self, replications, periods):
+        """
+        Lead time of an order placed in each period (same as sample_lead_time).
+
+        Returns:
+          int array (replications, periods, n_skus)
+        """
+        shape = (int(replications), int(periods), len(self.mean))
+        lead_times = np.maximum(1, np.round(self.rng.normal(5.0, 3.5, size=shape))).astype(np.int64)
+        lead_times[:, :, self.idx_a] = 2
+        return lead_times
+
+
+def draw_demand_streams(mean_demand, abc_classes, months, replications=1, seed=None):
+    """
+    Pre-draws demand and lead times for all replications, months and SKUs
+    (see DemandSampler). Reusing the streams across candidate policies gives
+    common random numbers.
+
+    Returns:
+      demand: int array (replications, months, n_skus)
+      lead_times: int array (replications, months, n_skus), lead time of an
+                  order placed in that month
+    """
+    sampler = DemandSampler(mean_demand, abc_classes, seed=seed)
+    demand = sampler.draw_block(replications, months)
+    lead_times = sampler.draw_lead_times(replications, months)
+    return demand, lead_times
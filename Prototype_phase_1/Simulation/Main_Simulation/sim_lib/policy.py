@@ -0,0 +1,255 @@
+# sim_lib/policy.py
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+
+import numpy as np
+
+from .demand import REORDER_FRACTIONS, draw_demand_streams
+
+# Default search grid (fractions of SKU capacity)
+RP_FRACTIONS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7)
+TARGET_FRACTIONS = (0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+
+# Streams shared with pool workers (set once per process by the initializer)
+_STREAMS = None
+
+
+def simulate_policy_vectorized(demand, lead_times, init_stock, max_capacity, rp_frac, target_frac):
+    """
+    Vectorized equivalent of run_simulation for all replications and SKUs at once.
+
+    SKU stock is aggregated over its locations (add_stock caps each location at
+    MAX_UNITS, so the SKU is capped at its total capacity). At most one open
+    order per SKU, as in place_replenishment_orders.
+
+    Args:
+      demand, lead_times: int arrays (replications, months, n_skus) from draw_demand_streams
+      init_stock, max_capacity: arrays (n_skus,)
+      rp_frac, target_frac: arrays (n_skus,) or scalars
+
+    Returns:
+      dict of arrays (replications, n_skus): "demand", "shipped", "lost", "avg_stock"
+    """
+    reps, months, n = demand.shape
+    cap = np.asarray(max_capacity, dtype=np.int64)
+
+    rp = (np.asarray(rp_frac, dtype=float) * cap).astype(np.int64)
+    target = (np.asarray(target_frac, dtype=float) * cap).astype(np.int64)
+    can_order = cap > 0
+
+    stock = np.broadcast_to(np.asarray(init_stock, dtype=np.int64), (reps, n)).copy()
+    pending = np.zeros((reps, n), dtype=np.int64)
+    arrival = np.zeros((reps, n), dtype=np.int64)
+
+    shipped = np.zeros((reps, n), dtype=np.int64)
+    stock_sum = np.zeros((reps, n), dtype=np.int64)
+
+    for m in range(months):
+        month = m + 1
+
+        # 1) Arrivals
+        arriving = (pending > 0) & (arrival == month)
+        stock = np.where(arriving, np.minimum(stock + pending, cap), stock)
+        pending[arriving] = 0
+
+        # 2) Demand & shipment
+        d = demand[:, m, :]
+        ship = np.minimum(stock, d)
+        stock -= ship
+        shipped += ship
+
+        # 3) Replenishment
+        order = can_order & (stock <= rp) & (pending == 0)
+        qty = np.where(order, np.maximum(0, target - stock), 0)
+        pending = np.where(qty > 0, qty, pending)
+        arrival = np.where(qty > 0, month + lead_times[:, m, :], arrival)
+
+        stock_sum += stock
+
+    total_demand = demand.sum(axis=1)
+    return {
+        "demand": total_demand,
+        "shipped": shipped,
+        "lost": total_demand - shipped,
+        "avg_stock": stock_sum / float(months),
+    }
+
+
+def _init_worker(streams):
+    global _STREAMS
+    _STREAMS = streams
+
+
+def _evaluate_candidate(args):
+    """
+    Pool task: one (rp_frac, target_frac) candidate on the shared streams.
+    Returns per-SKU means over replications (shipped, avg_stock).
+    """
+    rp_frac, target_frac = args
+    demand, lead_times, init_stock, max_capacity = _STREAMS
+    res = simulate_policy_vectorized(demand, lead_times, init_stock, max_capacity, rp_frac, target_frac)
+    return res["shipped"].mean(axis=0), res["avg_stock"].mean(axis=0)
+
+
+def _choose_per_group(shipped, stock, group_idx, n_groups, budget, max_combinations=200_000):
+    """
+    Picks one candidate per group maximizing total shipped s.t. total average
+    stock <= budget.
+
+    - Few groups (per ABC class): exact enumeration of all combinations.
+    - Many groups (per SKU): Lagrangian relaxation (bisection on the stock
+      price), then a greedy pass spending the remaining budget.
+
+    shipped, stock: arrays (n_candidates, n_skus)
+    Returns: int array (n_groups,) chosen candidate per group
+    """
+    n_cand = shipped.shape[0]
+
+    # Aggregate per group: (n_candidates, n_groups)
+    g_ship = np.zeros((n_cand, n_groups))
+    g_stock = np.zeros((n_cand, n_groups))
+    for c in range(n_cand):
+        g_ship[c] = np.bincount(group_idx, weights=shipped[c], minlength=n_groups)
+        g_stock[c] = np.bincount(group_idx, weights=stock[c], minlength=n_groups)
+
+    cols = np.arange(n_groups)
+
+    if n_cand ** n_groups <= max_combinations:
+        combos = np.array(list(product(range(n_cand), repeat=n_groups)), dtype=np.int64)
+        tot_ship = g_ship[combos, cols].sum(axis=1)
+        tot_stock = g_stock[combos, cols].sum(axis=1)
+        feasible = tot_stock <= budget if budget is not None else np.ones(len(combos), dtype=bool)
+        if not feasible.any():
+            return combos[int(np.argmin(tot_stock))]
+        # Max shipped, then min stock
+        order = np.lexsort((tot_stock[feasible], -tot_ship[feasible]))
+        return combos[feasible][order[0]]
+
+    def pick(lam):
+        # Prefer lower stock on ties
+        obj = g_ship - lam * g_stock - 1e-9 * g_stock
+        return np.argmax(obj, axis=0)
+
+    choice = pick(0.0)
+    if budget is None or g_stock[choice, cols].sum() <= budget:
+        return choice
+
+    lo, hi = 0.0, 1.0
+    while g_stock[pick(hi), cols].sum() > budget and hi < 1e9:
+        hi *= 2.0
+
+    for _ in range(60):
+        mid = 0.5 * (lo + hi)
+        if g_stock[pick(mid), cols].sum() > budget:
+            lo = mid
+        else:
+            hi = mid
+
+    choice = pick(hi)
+
+    # Greedy: spend what is left of the budget on the best shipped gains
+    slack = budget - g_stock[choice, cols].sum()
+    gain = g_ship - g_ship[choice, cols]
+    extra = g_stock - g_stock[choice, cols]
+    for g in np.argsort(-gain.max(axis=0)):
+        ok = (gain[:, g] > 0) & (extra[:, g] <= slack)
+        if not ok.any():
+            continue
+        c = int(np.argmax(np.where(ok, gain[:, g], -np.inf)))
+        slack -= extra[c, g]
+        choice[g] = c
+
+    return choice
+
+
+def optimize_reorder_params(
+    sku_state,
+    months=36,
+    replications=50,
+    seed=0,
+    per_sku=False,
+    max_avg_stock=None,
+    rp_fractions=RP_FRACTIONS,
+    target_fractions=TARGET_FRACTIONS,
+    n_workers=None,
+):
+    """
+    Searches reorder point / target fractions per ABC class (or per SKU) to
+    maximize fill rate subject to an average stock budget.
+
+    - Demand and lead times are pre-drawn once (common random numbers), so all
+      candidates see exactly the same scenarios.
+    - Each candidate is one vectorized stock update over all replications and
+      SKUs; candidates are evaluated in parallel in a process pool.
+    - SKUs only interact through the stock budget, so candidates are scored per
+      SKU and combined per group afterwards.
+
+    max_avg_stock: budget on total average stock (units); default = average
+    stock of the current ABC policy on the same streams.
+
+    Returns:
+      policy: {ABC class or item_id -> (rp_frac, target_frac)}, usable by run_simulation
+      summary: dict with fill rate / average stock for the baseline and the optimized policy
+    """
+    item_ids = list(sku_state.keys())
+    if not item_ids:
+        raise ValueError("sku_state is empty. Cannot optimize reorder parameters.")
+
+    abc = np.array([str(sku_state[i]["ABC"]) for i in item_ids])
+    mean_demand = np.array([sku_state[i]["mean_demand"] for i in item_ids], dtype=float)
+    init_stock = np.array([sku_state[i]["total_stock"] for i in item_ids], dtype=np.int64)
+    max_capacity = np.array([sku_state[i]["max_capacity"] for i in item_ids], dtype=np.int64)
+
+    demand, lead_times = draw_demand_streams(mean_demand, abc, months, replications, seed)
+    streams = (demand, lead_times, init_stock, max_capacity)
+
+    candidates = [(rp, t) for rp, t in product(rp_fractions, target_fractions) if rp < t]
+
+    # Baseline: current ABC defaults on the same streams
+    default = np.array([REORDER_FRACTIONS.get(c, REORDER_FRACTIONS["C"]) for c in abc])
+    base = simulate_policy_vectorized(demand, lead_times, init_stock, max_capacity, default[:, 0], default[:, 1])
+    base_shipped = base["shipped"].mean(axis=0)
+    base_stock = base["avg_stock"].mean(axis=0)
+
+    if n_workers is None:
+        n_workers = min(len(candidates), os.cpu_count() or 1)
+
+    if n_workers > 1:
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker, initargs=(streams,)) as pool:
+            results = list(pool.map(_evaluate_candidate, candidates))
+    else:
+        _init_worker(streams)
+        results = [_evaluate_candidate(c) for c in candidates]
+
+    shipped = np.array([r[0] for r in results])
+    stock = np.array([r[1] for r in results])
+
+    if per_sku:
+        group_keys = item_ids
+        group_idx = np.arange(len(item_ids))
+    else:
+        group_keys, group_idx = np.unique(abc, return_inverse=True)
+        group_keys = group_keys.tolist()
+
+    budget = float(base_stock.sum()) if max_avg_stock is None else float(max_avg_stock)
+    choice = _choose_per_group(shipped, stock, group_idx, len(group_keys), budget)
+
+    policy = {key: candidates[int(c)] for key, c in zip(group_keys, choice)}
+
+    chosen = choice[group_idx]
+    cols = np.arange(len(item_ids))
+    total_demand = float(demand.sum()) / replications
+
+    summary = {
+        "replications": int(replications),
+        "months": int(months),
+        "n_candidates": len(candidates),
+        "stock_budget": budget,
+        "baseline_fill_rate_pct": float(100.0 * base_shipped.sum() / total_demand) if total_demand > 0 else 0.0,
+        "baseline_avg_stock": float(base_stock.sum()),
+        "optimized_fill_rate_pct": float(100.0 * shipped[chosen, cols].sum() / total_demand) if total_demand > 0 else 0.0,
+        "optimized_avg_stock": float(stock[chosen, cols].sum()),
+    }
+
+    return policy, summary
@@ -0,0 +1,120 @@
+# sim_lib/replications.py
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .demand import REORDER_FRACTIONS, draw_demand_streams
+from .policy import simulate_policy_vectorized
+from .reporting import new_kpi_sketches, merge_kpi_sketches
+
+
+def _policy_fractions(item_ids, abc, policy):
+    fractions = []
+    for item_id, c in zip(item_ids, abc):
+        f = None
+        if policy:
+            f = policy.get(item_id, policy.get(c))
+        fractions.append(f or REORDER_FRACTIONS.get(c, REORDER_FRACTIONS["C"]))
+    return np.asarray(fractions, dtype=float)
+
+
+def _run_chunk(args):
+    """
+    Pool task: simulates one chunk of replications and returns its sketches
+    plus totals. Only the sketches leave the worker, never per-replication rows.
+    """
+    (seed_seq, n_reps, months, mean_demand, abc, init_stock, max_capacity,
+     fractions, compression) = args
+
+    demand, lead_times = draw_demand_streams(mean_demand, abc, months, n_reps, seed_seq)
+    res = simulate_policy_vectorized(
+        demand, lead_times, init_stock, max_capacity, fractions[:, 0], fractions[:, 1]
+    )
+
+    rep_demand = res["demand"].sum(axis=1)
+    rep_shipped = res["shipped"].sum(axis=1)
+    rep_lost = res["lost"].sum(axis=1)
+    rep_stock = res["avg_stock"].sum(axis=1)
+
+    sketches = new_kpi_sketches(compression)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fill = np.where(rep_demand > 0, 100.0 * rep_shipped / rep_demand, np.nan)
+    sketches["fill_rate_pct"].update_many(fill)
+    sketches["lost_units"].update_many(rep_lost)
+    sketches["avg_stock"].update_many(rep_stock)
+
+    # Per-SKU totals over the chunk (size n_skus, independent of replications)
+    totals = (res["demand"].sum(axis=0), res["shipped"].sum(axis=0), res["lost"].sum(axis=0))
+    return sketches, totals
+
+
+def run_replications(
+    sku_state,
+    replications=10_000,
+    months=36,
+    seed=0,
+    policy=None,
+    chunk_size=250,
+    n_workers=None,
+    compression=100,
+):
+    """
+    Runs many independent replications of the monthly inventory simulation
+    (vectorized, see simulate_policy_vectorized) in a process pool and
+    summarizes fill rate, lost units and average stock per replication with
+    streaming quantile sketches merged across workers. Memory is bounded by
+    chunk_size, not by the number of replications.
+
+    Returns:
+      kpi: {item_id -> {"demand", "shipped", "lost"}} summed over all replications
+           (same shape as run_simulation output, for report_simulation_results)
+      sketches: {metric -> TDigest}
+    """
+    item_ids = list(sku_state.keys())
+    if not item_ids:
+        raise ValueError("sku_state is empty. Cannot run replications.")
+
+    abc = np.array([str(sku_state[i]["ABC"]) for i in item_ids])
+    mean_demand = np.array([sku_state[i]["mean_demand"] for i in item_ids], dtype=float)
+    init_stock = np.array([sku_state[i]["total_stock"] for i in item_ids], dtype=np.int64)
+    max_capacity = np.array([sku_state[i]["max_capacity"] for i in item_ids], dtype=np.int64)
+    fractions = _policy_fractions(item_ids, abc, policy)
+
+    n_chunks = max(1, -(-int(replications) // int(chunk_size)))
+    sizes = [min(chunk_size, replications - i * chunk_size) for i in range(n_chunks)]
+    seeds = np.random.SeedSequence(seed).spawn(n_chunks)
+
+    tasks = [
+        (seeds[i], sizes[i], months, mean_demand, abc, init_stock, max_capacity, fractions, compression)
+        for i in range(n_chunks)
+    ]
+
+    if n_workers is None:
+        n_workers = min(n_chunks, os.cpu_count() or 1)
+
+    sketches = new_kpi_sketches(compression)
+    demand = np.zeros(len(item_ids), dtype=np.int64)
+    shipped = np.zeros(len(item_ids), dtype=np.int64)
+    lost = np.zeros(len(item_ids), dtype=np.int64)
+
+    def _collect(result):
+        chunk_sketches, (d, s, l) = result
+        merge_kpi_sketches(sketches, chunk_sketches)
+        np.add(demand, d, out=demand)
+        np.add(shipped, s, out=shipped)
+        np.add(lost, l, out=lost)
+
+    if n_workers > 1:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            for result in pool.map(_run_chunk, tasks):
+                _collect(result)
+    else:
+        for task in tasks:
+            _collect(_run_chunk(task))
+
+    kpi = {
+        item_id: {"demand": int(demand[i]), "shipped": int(shipped[i]), "lost": int(lost[i])}
+        for i, item_id in enumerate(item_ids)
+    }
+    return kpi, sketches
@@ -1,10 +1,15 @@
 # sim_lib/reporting.py
 from .geometry import print_ascii_layer
+from .sketches import TDigest
 import pandas as pd
 from pathlib import Path
 
 MM3_TO_M3 = 1e-9
 
+# KPIs summarized across replications (streaming quantiles)
+KPI_SKETCH_METRICS = ("fill_rate_pct", "lost_units", "avg_stock")
+KPI_QUANTILES = (0.05, 0.50, 0.95)
+
 def report_initial_state(locations, total_capacity, used_volume, max_print=30):
     print("\n--- WAREHOUSE INITIALIZATION (first 10 SKUs)---\n")
 
@@ -112,7 +117,26 @@ def export_allocations_csv(locations, filename="allocation.csv"):
     print(f"\nAllocation CSV written to: {csv_path.resolve()}\n")
 
 
-def report_simulation_results(kpi):
+def new_kpi_sketches(compression=100):
+    """
+    One streaming quantile sketch per replication KPI (constant memory).
+    """
+    return {metric: TDigest(compression) for metric in KPI_SKETCH_METRICS}
+
+
+def merge_kpi_sketches(sketches, other):
+    """
+    Merges sketches from another worker into `sketches` (in place).
+    """
+    for metric, sketch in other.items():
+        if metric in sketches:
+            sketches[metric].merge(sketch)
+        else:
+            sketches[metric] = sketch
+    return sketches
+
+
+def report_simulation_results(kpi, sketches=None):
     print("\n--- SIMULATION SUMMARY ---")
 
     total_demand = sum(v["demand"] for v in kpi.values())
@@ -129,3 +153,57 @@ def report_simulation_results(kpi):
         print(f"Fill rate (service level): {service_level:.2f}%")
     else:
         print("No demand generated.")
+
+    if not sketches:
+        return
+
+    n_reps = max(len(s) for s in sketches.values())
+    labels = "  ".join(f"{'P' + str(int(round(q * 100))):>12}" for q in KPI_QUANTILES)
+
+    print(f"\n--- REPLICATION DISTRIBUTION ({n_reps} replications) ---")
+    print(f"{'KPI':<15}{labels}")
+    for metric in KPI_SKETCH_METRICS:
+        sketch = sketches.get(metric)
+        if sketch is None or len(sketch) == 0:
+            continue
+        values = "  ".join(f"{sketch.quantile(q):>12.2f}" for q in KPI_QUANTILES)
+        print(f"{metric:<15}{values}")
+
+
+def report_reslotting_results(kpi, reslot_log, baseline_kpi=None, baseline_log=None):
+    """
+    Summary of a run_simulation_with_reslotting run. If a baseline run
+    (reslot_every=0) is given, prints fill rate / pick travel deltas and the
+    net benefit of re-slotting after move costs.
+    """
+    def _fill_rate(k):
+        demand = sum(v["demand"] for v in k.values())
+        shipped = sum(v["shipped"] for v in k.values())
+        return 100.0 * shipped / demand if demand > 0 else 0.0
+
+    def _travel_per_pick(k, log):
+        shipped = sum(v["shipped"] for v in k.values())
+        return log["pick_travel_m"] / shipped if shipped > 0 else 0.0
+
+    report_simulation_results(kpi)
+
+    print("\n--- RE-SLOTTING SUMMARY ---")
+    print(f"Moves:            {len(reslot_log['moves'])}")
+    print(f"Move cost:        {reslot_log['move_cost']:.2f}")
+    print(f"Pick travel:      {reslot_log['pick_travel_m']:.1f} m")
+    print(f"Travel per pick:  {_travel_per_pick(kpi, reslot_log):.2f} m")
+    print(f"Pick cost:        {reslot_log['pick_cost']:.2f}")
+    print(f"Total cost:       {reslot_log['total_cost']:.2f}")
+
+    if baseline_kpi is None or baseline_log is None:
+        return
+
+    d_fill = _fill_rate(kpi) - _fill_rate(baseline_kpi)
+    d_travel = reslot_log["pick_travel_m"] - baseline_log["pick_travel_m"]
+    net = baseline_log["total_cost"] - reslot_log["total_cost"]
+
+    print("\n--- VS. BASELINE (no re-slotting) ---")
+    print(f"Fill rate delta:  {d_fill:+.2f} pp")
+    print(f"Pick travel delta: {d_travel:+.1f} m")
+    print(f"Travel per pick delta: {_travel_per_pick(kpi, reslot_log) - _travel_per_pick(baseline_kpi, baseline_log):+.2f} m")
+    print(f"Net benefit (pick cost saved - move cost): {net:+.2f}")
@@ -0,0 +1,356 @@
+# sim_lib/reslotting.py
+import bisect
+
+from .allocation import cached_capacity
+from .distance import manhattan_distance
+from .geometry import compute_actual_layout, build_actual_matrix
+from .simulation import receive_orders, place_replenishment_orders, consume_stock, demand_streams
+
+MM_TO_M = 1e-3
+
+
+def build_entrance_distances(locations):
+    """
+    Travel distance from the entrance to every location.
+
+    Entrance (Guide convention): X = 0, Y = maxY / 2.
+    Travel is Manhattan in X/Y only (Z is a height constraint, not travel).
+
+    Returns:
+      dict[loc_id -> float] distance in mm
+    """
+    max_y = max((loc["POS_Y_MM"] for loc in locations), default=0)
+    entrance_y = max_y / 2.0
+
+    return {
+        loc["LOCATION_ID"]: float(abs(loc["POS_X_MM"]) + abs(loc["POS_Y_MM"] - entrance_y))
+        for loc in locations
+    }
+
+
+def demand_ranks(demand_by_sku):
+    """
+    Rank SKUs by demand (0 = highest demand). Ties are broken by ITEM_ID so
+    ranks are stable between calls.
+
+    Returns:
+      dict[item_id -> int]
+    """
+    ordered = sorted(demand_by_sku.items(), key=lambda kv: (-kv[1], str(kv[0])))
+    return {item_id: rank for rank, (item_id, _) in enumerate(ordered)}
+
+
+def find_rank_changes(prev_ranks, new_ranks, tolerance=0.05):
+    """
+    SKUs whose demand rank moved by more than `tolerance` (fraction of the
+    number of SKUs). Only these SKUs are handed to the relocation engine.
+    """
+    n = max(1, len(new_ranks))
+    max_shift = tolerance * n
+
+    return [
+        item_id
+        for item_id, rank in new_ranks.items()
+        if item_id in prev_ranks and abs(rank - prev_ranks[item_id]) > max_shift
+    ]
+
+
+def _reset_location(loc):
+    loc.update({
+        "ASSIGNED_SKU": None,
+        "MAX_UNITS": 0,
+        "INIT_UNITS": 0,
+        "CURRENT_STOCK": 0,
+        "ORIENTATION": None,
+        "GRID": None,
+        "FULL_LAYERS": 0,
+        "PARTIAL_UNITS": 0,
+        "UNITS_PER_LAYER": 0,
+        "FULL_LAYERS_MTX": None,
+        "PARTIAL_LAYER_MTX": None,
+        "STORED_VOLUME_MM3": 0.0,
+    })
+
+
+def rank_based_reslot(sku_state, locations, changed_skus, ranks, entrance_dist, part_meta, fit_cache, move_benefit=None):
+    """
+    Default relocation engine (incremental).
+
+    For every changed SKU, the pick location (first location in the SKU state,
+    which is where consume_stock picks from first) is moved to the free
+    location whose entrance distance best matches the SKU's new demand rank:
+    rank 0 targets the closest slot, the last rank the n-th closest slot
+    (n = number of occupied slots), so stock is packed towards the entrance.
+
+    Hard constraints:
+      - target slot must be empty (single SKU per location)
+      - current stock must fit in the target slot (geometry library)
+      - target slot capacity must not be below the source slot capacity, so
+        the SKU's replenishment targets do not shrink
+      - move_benefit(item_id, from_id, to_id) > 0 when given (expected pick
+        cost saved minus move cost, see run_simulation_with_reslotting)
+
+    Any callable with this signature (move_benefit is passed as a keyword) can
+    be passed to run_simulation_with_reslotting as `engine`; the moves it
+    returns are checked against move_benefit again before they are applied.
+
+    Returns:
+      list of moves: {"ITEM_ID", "FROM", "TO"}
+    """
+    if not changed_skus:
+        return []
+
+    all_dists = sorted(entrance_dist.values())
+    n_ranks = max(1, len(ranks) - 1)
+    n_used = max(1, sum(1 for loc in locations if loc["ASSIGNED_SKU"] is not None))
+
+    free = sorted(
+        (entrance_dist[loc["LOCATION_ID"]], loc["LOCATION_ID"])
+        for loc in locations
+        if loc["ASSIGNED_SKU"] is None
+    )
+    free_keys = [d for d, _ in free]
+    locations_index = {loc["LOCATION_ID"]: loc for loc in locations}
+
+    moves = []
+
+    # Highest demand first so it gets the first pick of close slots
+    for item_id in sorted(changed_skus, key=lambda s: ranks[s]):
+        state = sku_state.get(item_id)
+        if not state or not state["locations"]:
+            continue
+
+        sku = part_meta.get(item_id)
+        if sku is None:
+            continue
+
+        src = state["locations"][0]
+        stock = int(src["CURRENT_STOCK"])
+
+        target = all_dists[int(round(ranks[item_id] / n_ranks * (n_used - 1)))]
+        current_gap = abs(entrance_dist[src["LOCATION_ID"]] - target)
+
+        # Moving away from the entrance never pays for itself
+        n_free = len(free)
+        if move_benefit is not None:
+            n_free = bisect.bisect_left(free_keys, entrance_dist[src["LOCATION_ID"]])
+
+        # Walk outwards from the target distance, stop at the first slot that fits
+        hi = min(bisect.bisect_left(free_keys, target), n_free)
+        lo = hi - 1
+        chosen = None
+
+        while lo >= 0 or hi < n_free:
+            if hi >= n_free or (lo >= 0 and target - free_keys[lo] <= free_keys[hi] - target):
+                idx, lo = lo, lo - 1
+            else:
+                idx, hi = hi, hi + 1
+
+            dist, loc_id = free[idx]
+            if abs(dist - target) >= current_gap:
+                break  # nothing left that is closer to target than the current slot
+
+            if move_benefit is not None and move_benefit(item_id, src["LOCATION_ID"], loc_id) <= 0:
+                continue
+            max_units, _, _ = cached_capacity(locations_index[loc_id], sku, fit_cache)
+            if max_units <= 0 or max_units < max(stock, int(src["MAX_UNITS"])):
+                continue
+
+            chosen = idx
+            break
+
+        if chosen is None:
+            continue
+
+        _, to_id = free.pop(chosen)
+        free_keys.pop(chosen)
+
+        # The released slot becomes available for the next SKUs
+        released = (entrance_dist[src["LOCATION_ID"]], src["LOCATION_ID"])
+        pos = bisect.bisect_left(free, released)
+        free.insert(pos, released)
+        free_keys.insert(pos, released[0])
+
+        moves.append({"ITEM_ID": item_id, "FROM": src["LOCATION_ID"], "TO": to_id})
+
+    return moves
+
+
+def apply_move(move, sku_state, locations_index, part_meta, fit_cache):
+    """
+    Moves the full content of move["FROM"] into the empty slot move["TO"]
+    and updates the SKU state (locations, max_capacity).
+
+    Returns:
+      bool: False if the move is no longer feasible
+    """
+    item_id = move["ITEM_ID"]
+    src = locations_index[move["FROM"]]
+    dst = locations_index[move["TO"]]
+
+    if src["ASSIGNED_SKU"] != item_id or dst["ASSIGNED_SKU"] is not None:
+        return False
+
+    sku = part_meta[item_id]
+    max_units, orientation, grid = cached_capacity(dst, sku, fit_cache)
+    units = int(src["CURRENT_STOCK"])
+    if max_units <= 0 or units > max_units:
+        return False
+
+    full_layers, units_per_layer, partial_units = compute_actual_layout(units, grid)
+    full_mtx, partial_mtx = build_actual_matrix(units, grid)
+
+    dst.update({
+        "ASSIGNED_SKU": item_id,
+        "MAX_UNITS": int(max_units),
+        "INIT_UNITS": int(src["INIT_UNITS"]),
+        "CURRENT_STOCK": units,
+        "ORIENTATION": orientation,
+        "GRID": grid,
+        "FULL_LAYERS": int(full_layers),
+        "PARTIAL_UNITS": int(partial_units),
+        "UNITS_PER_LAYER": int(units_per_layer),
+        "FULL_LAYERS_MTX": full_mtx,
+        "PARTIAL_LAYER_MTX": partial_mtx,
+        "STORED_VOLUME_MM3": units * float(sku["VOLUME_MM3"]),
+    })
+
+    state = sku_state[item_id]
+    state["locations"] = [dst if loc is src else loc for loc in state["locations"]]
+    state["max_capacity"] += int(max_units) - int(src["MAX_UNITS"])
+
+    _reset_location(src)
+    return True
+
+
+def run_simulation_with_reslotting(
+    sku_state,
+    locations,
+    part_meta,
+    months=36,
+    reslot_every=6,
+    engine=rank_based_reslot,
+    rank_tolerance=0.05,
+    move_fixed_cost=5.0,
+    move_cost_per_m=0.5,
+    pick_cost_per_m=0.01,
+    sampler=None,
+):
+    """
+    Monthly simulation (same demand + replenishment as run_simulation) that
+    calls a relocation engine every `reslot_every` months on the current stock.
+
+    Only SKUs whose demand rank (observed over the last window) changed by more
+    than `rank_tolerance` are passed to the engine, so each call stays cheap.
+    A move is only applied if it pays for itself before the next re-slot: the
+    pick cost saved on the units shipped in the last window (projected over
+    the months left until the next call) must exceed its move cost.
+    reslot_every=0 disables re-slotting (baseline run with the same KPIs).
+    Pass DemandSamplers built with the same seed to both runs for a paired
+    comparison: demand and replenishment lead times are both drawn from the
+    sampler (see demand_streams).
+
+    Costs:
+      - every move:  move_fixed_cost + move_cost_per_m * manhattan distance(FROM, TO)
+      - every pick:  pick_cost_per_m * round-trip distance entrance -> slot
+        (each shipped unit counts as one pick)
+
+    Returns:
+      kpi: dict[item_id -> {"demand", "shipped", "lost", "travel_mm"}]
+      reslot_log: dict with "moves" (list), "move_cost", "pick_travel_m",
+                  "pick_cost", "total_cost"
+    """
+    locations_index = {loc["LOCATION_ID"]: loc for loc in locations}
+    entrance_dist = build_entrance_distances(locations)
+    fit_cache = {}
+
+    kpi = {
+        item_id: {"demand": 0, "shipped": 0, "lost": 0, "travel_mm": 0.0}
+        for item_id in sku_state.keys()
+    }
+
+    ranks = demand_ranks({item_id: s["mean_demand"] for item_id, s in sku_state.items()})
+    window_demand = {item_id: 0 for item_id in sku_state.keys()}
+    window_shipped = {item_id: 0 for item_id in sku_state.keys()}
+
+    moves_log = []
+    move_cost = 0.0
+
+    def _move_cost(from_id, to_id):
+        dist_m = manhattan_distance(from_id, to_id, locations_index) * MM_TO_M
+        return move_fixed_cost + move_cost_per_m * dist_m, dist_m
+
+    def _move_benefit(item_id, from_id, to_id):
+        horizon = min(reslot_every, months - month)
+        picks = window_shipped[item_id] * horizon / reslot_every
+        saved_m = 2.0 * (entrance_dist[from_id] - entrance_dist[to_id]) * MM_TO_M * picks
+        return pick_cost_per_m * saved_m - _move_cost(from_id, to_id)[0]
+
+    demand_mtx, lead_time_mtx = demand_streams(sku_state, months, sampler)
+    demand_mtx = demand_mtx.tolist()
+
+    for month in range(1, months + 1):
+
+        # 1) Process arriving orders
+        receive_orders(sku_state, month)
+
+        # 2) Demand & shipment (picks are charged by slot distance)
+        month_demand = demand_mtx[month - 1]
+        for j, (item_id, state) in enumerate(sku_state.items()):
+            demand = month_demand[j]
+
+            before = [loc["CURRENT_STOCK"] for loc in state["locations"]]
+            shipped, lost = consume_stock(item_id, demand, sku_state)
+
+            if shipped > 0:
+                travel = 0.0
+                for loc, prev in zip(state["locations"], before):
+                    taken = prev - loc["CURRENT_STOCK"]
+                    if taken > 0:
+                        travel += 2.0 * taken * entrance_dist[loc["LOCATION_ID"]]
+                kpi[item_id]["travel_mm"] += travel
+
+            kpi[item_id]["demand"] += demand
+            kpi[item_id]["shipped"] += shipped
+            kpi[item_id]["lost"] += lost
+            window_demand[item_id] += demand
+            window_shipped[item_id] += shipped
+
+        # 3) Replenishment decisions
+        place_replenishment_orders(sku_state, month, lead_times=lead_time_mtx[month - 1])
+
+        # 4) Periodic incremental re-slotting
+        if reslot_every and month % reslot_every == 0 and month < months:
+            new_ranks = demand_ranks(window_demand)
+            changed = find_rank_changes(ranks, new_ranks, tolerance=rank_tolerance)
+
+            moves = engine(
+                sku_state, locations, changed, new_ranks, entrance_dist, part_meta, fit_cache,
+                move_benefit=_move_benefit,
+            )
+
+            for move in moves:
+                if _move_benefit(move["ITEM_ID"], move["FROM"], move["TO"]) <= 0:
+                    continue
+                if not apply_move(move, sku_state, locations_index, part_meta, fit_cache):
+                    continue
+                cost, dist_m = _move_cost(move["FROM"], move["TO"])
+                move_cost += cost
+                moves_log.append({**move, "MONTH": month, "DIST_M": dist_m, "COST": cost})
+
+            ranks = new_ranks
+            window_demand = {item_id: 0 for item_id in sku_state.keys()}
+            window_shipped = {item_id: 0 for item_id in sku_state.keys()}
+
+    pick_travel_m = sum(v["travel_mm"] for v in kpi.values()) * MM_TO_M
+    pick_cost = pick_cost_per_m * pick_travel_m
+
+    reslot_log = {
+        "moves": moves_log,
+        "move_cost": move_cost,
+        "pick_travel_m": pick_travel_m,
+        "pick_cost": pick_cost,
+        "total_cost": move_cost + pick_cost,
+    }
+
+    return kpi, reslot_log
@@ -1,4 +1,6 @@
-from .demand import sample_demand, get_reorder_params, sample_lead_time
+import numpy as np
+
+from .demand import DemandSampler, get_reorder_params, sample_lead_time
 
 
 def build_sku_state(part_meta, locations):
@@ -83,9 +85,78 @@ def add_stock(item_id, qty, sku_state):
     return added
 
 
-def run_simulation(sku_state, months=36):
+def receive_orders(sku_state, month):
+    """
+    Puts away every open replenishment order arriving in `month`.
+    """
+    for item_id, state in sku_state.items():
+        if not state["open_orders"]:
+            continue
+
+        arriving = [o for o in state["open_orders"] if o["arrival"] == month]
+        still_open = [o for o in state["open_orders"] if o["arrival"] > month]
+
+        for order in arriving:
+            add_stock(item_id, order["qty"], sku_state)
+
+        state["open_orders"] = still_open
+
+
+def place_replenishment_orders(sku_state, month, policy=None, lead_times=None):
+    """
+    (s, S) replenishment: order up to target when stock drops to the reorder point
+    and no order is already open for the SKU.
+
+    policy: optional {item_id or ABC class -> (rp_frac, target_frac)}; per-SKU
+    entries win over per-class ones, missing entries use the ABC defaults.
+    lead_times: optional lead time per SKU (sku_state order) for orders placed
+    this month, e.g. a row of demand_streams; default: sample_lead_time.
+    """
+    for j, (item_id, state) in enumerate(sku_state.items()):
+        max_cap = state["max_capacity"]
+        if max_cap <= 0:
+            continue
+
+        fractions = None
+        if policy:
+            fractions = policy.get(item_id, policy.get(state["ABC"]))
+
+        rp, target = get_reorder_params(state["ABC"], max_cap, fractions)
+
+        if state["total_stock"] <= rp and len(state["open_orders"]) == 0:
+            order_qty = max(0, target - state["total_stock"])
+            if order_qty > 0:
+                lt = sample_lead_time(state["ABC"]) if lead_times is None else int(lead_times[j])
+                arrival = month + lt
+                state["open_orders"].append({"qty": order_qty, "arrival": arrival})
+
+
+def demand_streams(sku_state, months, sampler=None):
+    """
+    Pre-draws the demand and the replenishment lead times of all SKUs for all
+    months in one block, both from the same sampler stream.
+
+    sampler: optional DemandSampler (e.g. with a fixed seed); its SKUs must
+    match sku_state. Default: a sampler seeded from the global NumPy RNG, so
+    np.random.seed(...) still makes runs reproducible.
+
+    Returns:
+      demand: int array (months, n_skus), columns in sku_state order
+      lead_times: int array (months, n_skus), lead time of an order placed in that month
+    """
+    if sampler is None:
+        sampler = DemandSampler.from_sku_state(sku_state, seed=np.random.randint(2**31))
+    elif list(sampler.item_ids) != list(sku_state.keys()):
+        raise ValueError("DemandSampler SKUs do not match sku_state (build it with DemandSampler.from_sku_state).")
+    return sampler.draw(months), sampler.draw_lead_times(1, months)[0]
+
+
+def run_simulation(sku_state, months=36, policy=None, sampler=None):
     """
     Monthly simulation with demand + replenishment.
+    policy: optional reorder policy, see place_replenishment_orders.
+    sampler: optional DemandSampler; demand and lead times for all months are
+    drawn up front (see demand_streams).
     Returns KPI dict per SKU.
     """
     kpi = {
@@ -93,27 +164,18 @@ def run_simulation(sku_state, months=36):
         for item_id in sku_state.keys()
     }
 
+    demand_mtx, lead_time_mtx = demand_streams(sku_state, months, sampler)
+    demand_mtx = demand_mtx.tolist()
+
     for month in range(1, months + 1):
 
         # 1) Process arriving orders
-        for item_id, state in sku_state.items():
-            if not state["open_orders"]:
-                continue
-
-            arriving = [o for o in state["open_orders"] if o["arrival"] == month]
-            still_open = [o for o in state["open_orders"] if o["arrival"] > month]
-
-            for order in arriving:
-                add_stock(item_id, order["qty"], sku_state)
-
-            state["open_orders"] = still_open
+        receive_orders(sku_state, month)
 
         # 2) Demand & shipment
-        for item_id, state in sku_state.items():
-            mean_d = state["mean_demand"]
-            abc = state["ABC"]
-
-            demand = sample_demand(mean_d, abc)
+        month_demand = demand_mtx[month - 1]
+        for j, (item_id, state) in enumerate(sku_state.items()):
+            demand = month_demand[j]
             shipped, lost = consume_stock(item_id, demand, sku_state)
 
             kpi[item_id]["demand"] += demand
@@ -121,18 +183,6 @@ def run_simulation(sku_state, months=36):
             kpi[item_id]["lost"] += lost
 
         # 3) Replenishment decisions
-        for item_id, state in sku_state.items():
-            max_cap = state["max_capacity"]
-            if max_cap <= 0:
-                continue
-
-            rp, target = get_reorder_params(state["ABC"], max_cap)
-
-            if state["total_stock"] <= rp and len(state["open_orders"]) == 0:
-                order_qty = max(0, target - state["total_stock"])
-                if order_qty > 0:
-                    lt = sample_lead_time(state["ABC"])
-                    arrival = month + lt
-                    state["open_orders"].append({"qty": order_qty, "arrival": arrival})
+        place_replenishment_orders(sku_state, month, policy, lead_time_mtx[month - 1])
 
     return kpi
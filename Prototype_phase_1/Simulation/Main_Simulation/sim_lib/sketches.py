@@ -0,0 +1,152 @@
+# sim_lib/sketches.py
+import math
+
+import numpy as np
+
+
+class TDigest:
+    """
+    Streaming quantile sketch (merging t-digest, k1 scale function).
+
+    Memory is bounded by `compression` centroids whatever the number of values,
+    and two digests built in different processes can be merged (merge()), so
+    replication KPIs can be summarized without keeping per-replication results.
+
+    Usage:
+      d = TDigest()
+      d.update(0.93); d.update_many(values)
+      d.merge(other_digest)
+      d.quantile(0.95)
+    """
+
+    def __init__(self, compression=100, buffer_size=None):
+        self.compression = float(compression)
+        self.buffer_size = int(buffer_size or 10 * compression)
+
+        self.means = np.zeros(0, dtype=float)
+        self.weights = np.zeros(0, dtype=float)
+        self.buffer = []
+
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    # -----------------------
+    # Updates
+    # -----------------------
+    def update(self, x, w=1.0):
+        x = float(x)
+        if math.isnan(x):
+            return
+        self.buffer.append((x, float(w)))
+        self.count += w
+        self.min = min(self.min, x)
+        self.max = max(self.max, x)
+        if len(self.buffer) >= self.buffer_size:
+            self._compress()
+
+    def update_many(self, values):
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return
+        self._compress(values, np.ones(values.size))
+        self.count += values.size
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    def merge(self, other):
+        """
+        Merges another digest into this one (in place) and returns self.
+        """
+        other._compress()
+        if other.count == 0:
+            return self
+        self._compress(other.means, other.weights)
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    # -----------------------
+    # Compression
+    # -----------------------
+    def _k_limit(self, q):
+        # q limit of the next centroid: k^-1(k(q) + 1) with k(q) = d/(2pi) * asin(2q - 1)
+        k = self.compression / (2.0 * math.pi) * math.asin(2.0 * q - 1.0) + 1.0
+        if k >= self.compression / 4.0:
+            return 1.0
+        return (math.sin(2.0 * math.pi * k / self.compression) + 1.0) / 2.0
+
+    def _compress(self, extra_means=None, extra_weights=None):
+        parts_m = [self.means]
+        parts_w = [self.weights]
+
+        if self.buffer:
+            buf = np.asarray(self.buffer, dtype=float)
+            parts_m.append(buf[:, 0])
+            parts_w.append(buf[:, 1])
+            self.buffer = []
+
+        if extra_means is not None:
+            parts_m.append(np.asarray(extra_means, dtype=float))
+            parts_w.append(np.asarray(extra_weights, dtype=float))
+
+        means = np.concatenate(parts_m)
+        weights = np.concatenate(parts_w)
+        if means.size <= 1:
+            self.means, self.weights = means, weights
+            return
+
+        order = np.argsort(means, kind="mergesort")
+        means = means[order]
+        weights = weights[order]
+        total = float(weights.sum())
+
+        new_m, new_w = [], []
+        cur_m, cur_w = float(means[0]), float(weights[0])
+        q0 = 0.0
+        q_limit = self._k_limit(q0)
+
+        for m, w in zip(means[1:].tolist(), weights[1:].tolist()):
+            proposed = cur_w + w
+            if q0 + proposed / total <= q_limit:
+                cur_m += (m - cur_m) * w / proposed
+                cur_w = proposed
+            else:
+                new_m.append(cur_m)
+                new_w.append(cur_w)
+                q0 += cur_w / total
+                q_limit = self._k_limit(min(q0, 1.0))
+                cur_m, cur_w = m, w
+
+        new_m.append(cur_m)
+        new_w.append(cur_w)
+
+        self.means = np.asarray(new_m)
+        self.weights = np.asarray(new_w)
+
+    # -----------------------
+    # Queries
+    # -----------------------
+    def quantile(self, q):
+        """
+        Estimated q-quantile (0 <= q <= 1). Returns NaN for an empty digest.
+        """
+        self._compress()
+        if self.count == 0:
+            return math.nan
+
+        q = min(1.0, max(0.0, float(q)))
+        total = float(self.weights.sum())
+        centers = np.cumsum(self.weights) - self.weights / 2.0
+
+        xs = np.concatenate(([0.0], centers, [total]))
+        ys = np.concatenate(([self.min], self.means, [self.max]))
+        return float(np.interp(q * total, xs, ys))
+
+    def quantiles(self, qs):
+        return [self.quantile(q) for q in qs]
+
+    def __len__(self):
+        return int(self.count)
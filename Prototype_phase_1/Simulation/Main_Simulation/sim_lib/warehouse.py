@@ -103,6 +103,12 @@ def main():
     # kpi = run_simulation(sku_state, months=36)
     # report_simulation_results(kpi)
 
+    # 7) Optional: simulation with periodic re-slotting (move costs charged)
+    # from .reslotting import run_simulation_with_reslotting
+    # from .reporting import report_reslotting_results
+    # kpi, reslot_log = run_simulation_with_reslotting(sku_state, locations, part_meta, months=36, reslot_every=6)
+    # report_reslotting_results(kpi, reslot_log)
+
 
 if __name__ == "__main__":
     main()
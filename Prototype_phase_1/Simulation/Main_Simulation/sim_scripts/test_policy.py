@@ -0,0 +1,127 @@
+# sim_scripts/test_policy.py
+import copy
+from itertools import product
+
+import numpy as np
+
+import sim_lib.simulation as simulation
+from sim_lib.demand import REORDER_FRACTIONS, DemandSampler
+from sim_lib.policy import _choose_per_group, simulate_policy_vectorized
+
+
+def _sku_state(n_skus=12, seed=0):
+    # Two locations per SKU, so add_stock / consume_stock spread over locations
+    rng = np.random.default_rng(seed)
+    state = {}
+    for i in range(n_skus):
+        caps = rng.integers(0, 40, size=2) if i else np.zeros(2, dtype=np.int64)
+        stock = [int(rng.integers(0, c + 1)) for c in caps]
+        state[f"SKU{i}"] = {
+            "ABC": "ABC"[i % 3],
+            "mean_demand": float(rng.uniform(0.0, 25.0)),
+            "locations": [{"MAX_UNITS": int(c), "CURRENT_STOCK": s} for c, s in zip(caps, stock)],
+            "total_stock": sum(stock),
+            "max_capacity": int(caps.sum()),
+            "open_orders": [],
+        }
+    return state
+
+
+def _totals(shipped, stock, group_idx, choice):
+    cols = np.arange(len(group_idx))
+    chosen = np.asarray(choice)[group_idx]
+    return shipped[chosen, cols].sum(), stock[chosen, cols].sum()
+
+
+def _brute_force(shipped, stock, group_idx, n_groups, budget):
+    best = None
+    for combo in product(range(shipped.shape[0]), repeat=n_groups):
+        ship, st = _totals(shipped, stock, group_idx, combo)
+        if st <= budget and (best is None or ship > best):
+            best = ship
+    return best
+
+
+def test_exact_enumeration_hand_checked():
+    # One SKU per group, candidates are rows
+    shipped = np.array([[10.0, 4.0], [14.0, 9.0], [15.0, 10.0]])
+    stock = np.array([[2.0, 1.0], [5.0, 4.0], [9.0, 6.0]])
+    group_idx = np.array([0, 1])
+
+    # Budget 9: (1, 1) ships 23 with stock 9; (0, 2) only ships 20
+    choice = _choose_per_group(shipped, stock, group_idx, 2, budget=9.0)
+    assert list(choice) == [1, 1]
+
+    # No budget: highest shipped everywhere
+    assert list(_choose_per_group(shipped, stock, group_idx, 2, budget=None)) == [2, 2]
+
+    # Infeasible budget: least stock
+    assert list(_choose_per_group(shipped, stock, group_idx, 2, budget=1.0)) == [0, 0]
+
+
+def test_budget_respected_and_exact_matches_brute_force():
+    rng = np.random.default_rng(3)
+    n_cand, n_skus, n_groups = 5, 9, 3
+    group_idx = np.arange(n_skus) % n_groups
+
+    for _ in range(20):
+        # More stock ships more, with diminishing returns
+        stock = np.sort(rng.uniform(1.0, 10.0, size=(n_cand, n_skus)), axis=0)
+        shipped = 20.0 * np.sqrt(stock) + rng.uniform(0.0, 1.0, size=(n_cand, n_skus))
+        budget = float(rng.uniform(stock[0].sum(), stock[-1].sum()))
+        optimum = _brute_force(shipped, stock, group_idx, n_groups, budget)
+
+        exact = _choose_per_group(shipped, stock, group_idx, n_groups, budget)
+        ship, st = _totals(shipped, stock, group_idx, exact)
+        assert st <= budget + 1e-9
+        assert np.isclose(ship, optimum)
+
+        # Lagrangian + greedy path (enumeration disabled)
+        lagr = _choose_per_group(shipped, stock, group_idx, n_groups, budget, max_combinations=0)
+        ship, st = _totals(shipped, stock, group_idx, lagr)
+        assert st <= budget + 1e-9
+        assert 0.95 * optimum <= ship <= optimum + 1e-9
+
+
+def test_vectorized_simulation_matches_run_simulation(monkeypatch):
+    months, seed = 36, 5
+    sku_state = _sku_state()
+    policy = {"SKU4": (0.2, 1.0), "B": (0.6, 0.7)}
+
+    # run_simulation on the loop implementation, recording end-of-month stock
+    stock_sum = dict.fromkeys(sku_state, 0)
+    place_orders = simulation.place_replenishment_orders
+
+    def place_and_record(state, month, *args, **kwargs):
+        place_orders(state, month, *args, **kwargs)
+        for item_id, s in state.items():
+            stock_sum[item_id] += s["total_stock"]
+
+    monkeypatch.setattr(simulation, "place_replenishment_orders", place_and_record)
+    loop_state = copy.deepcopy(sku_state)
+    kpi = simulation.run_simulation(
+        loop_state, months=months, policy=policy, sampler=DemandSampler.from_sku_state(loop_state, seed=seed)
+    )
+
+    # Same streams for the vectorized version (draw, then draw_lead_times)
+    sampler = DemandSampler.from_sku_state(sku_state, seed=seed)
+    demand = sampler.draw_block(1, months)
+    lead_times = sampler.draw_lead_times(1, months)
+    fractions = np.array([
+        policy.get(i, policy.get(s["ABC"], REORDER_FRACTIONS[s["ABC"]])) for i, s in sku_state.items()
+    ])
+    res = simulate_policy_vectorized(
+        demand,
+        lead_times,
+        [s["total_stock"] for s in sku_state.values()],
+        [s["max_capacity"] for s in sku_state.values()],
+        fractions[:, 0],
+        fractions[:, 1],
+    )
+
+    assert sum(v["lost"] for v in kpi.values()) > 0  # stockouts are exercised
+    for j, item_id in enumerate(sku_state):
+        assert res["demand"][0, j] == kpi[item_id]["demand"]
+        assert res["shipped"][0, j] == kpi[item_id]["shipped"]
+        assert res["lost"][0, j] == kpi[item_id]["lost"]
+        assert np.isclose(res["avg_stock"][0, j], stock_sum[item_id] / months)
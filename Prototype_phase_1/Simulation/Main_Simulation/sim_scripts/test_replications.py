@@ -0,0 +1,69 @@
+# sim_scripts/test_replications.py
+import numpy as np
+
+from sim_lib.replications import run_replications
+from sim_lib.sketches import TDigest
+
+QUANTILES = (0.05, 0.50, 0.95)
+
+
+def _sku_state(n_skus=30, seed=0):
+    rng = np.random.default_rng(seed)
+    abc = np.array(["A", "B", "C"])[np.arange(n_skus) % 3]
+    return {
+        f"SKU{i}": {
+            "ABC": abc[i],
+            "mean_demand": float(rng.uniform(1.0, 20.0)),
+            "total_stock": int(rng.integers(0, 60)),
+            "max_capacity": int(rng.integers(20, 80)),
+        }
+        for i in range(n_skus)
+    }
+
+
+def test_merged_sketches_match_numpy_quantiles():
+    rng = np.random.default_rng(7)
+    samples = rng.gamma(2.0, 10.0, size=40_000)
+
+    # One sketch per "worker", merged as in run_replications
+    merged = TDigest()
+    for chunk in np.array_split(samples, 8):
+        d = TDigest()
+        d.update_many(chunk)
+        merged.merge(d)
+
+    assert len(merged) == samples.size
+    for q in QUANTILES:
+        est = merged.quantile(q)
+        # Rank error: share of samples below the estimate is close to q
+        assert abs(np.mean(samples <= est) - q) < 0.01
+        assert abs(est - np.quantile(samples, q)) < 0.02 * np.ptp(samples)
+
+
+def test_single_value_updates_match_bulk_updates():
+    values = np.random.default_rng(1).gamma(2.0, 10.0, size=5_000)
+    one_by_one, bulk = TDigest(), TDigest()
+    for v in values:
+        one_by_one.update(v)
+    bulk.update_many(values)
+
+    for q in QUANTILES:
+        assert abs(one_by_one.quantile(q) - bulk.quantile(q)) < 0.01 * np.ptp(values)
+
+
+def test_fixed_seed_reproducible_across_worker_counts():
+    sku_state = _sku_state()
+    runs = [
+        run_replications(sku_state, replications=600, months=12, seed=11, chunk_size=100, n_workers=n)
+        for n in (1, 3)
+    ]
+
+    (kpi_1, sketches_1), (kpi_3, sketches_3) = runs
+    assert kpi_1 == kpi_3
+    for metric, sketch in sketches_1.items():
+        assert len(sketch) == len(sketches_3[metric])
+        assert sketch.quantiles(QUANTILES) == sketches_3[metric].quantiles(QUANTILES)
+
+    # A different seed gives different streams
+    kpi_other, _ = run_replications(sku_state, replications=600, months=12, seed=12, chunk_size=100, n_workers=1)
+    assert kpi_other != kpi_1
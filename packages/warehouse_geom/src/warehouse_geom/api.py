@@ -1,9 +1,11 @@
 from .geometry import compute_layered_capacity, compute_actual_layout, build_actual_matrix
 from .distance import manhattan_distance
+from .neighbors import build_neighbor_csr
 
 __all__ = [
     "compute_layered_capacity",
     "compute_actual_layout",
     "build_actual_matrix",
     "manhattan_distance",
+    "build_neighbor_csr",
 ]
@@ -0,0 +1,55 @@
+# warehouse_geom/neighbors.py
+import numpy as np
+import pandas as pd
+
+
+def build_neighbor_csr(df_loc):
+    """
+    Bin neighbor relation (used by the affinity reward) as CSR arrays over the
+    rows of a locations DataFrame.
+
+    Neighbors:
+      - row_num/bay_num/level_num available: bay-1 and bay+1 in the same (row, level)
+      - otherwise: previous and next bin along X in the same (y, z)
+
+    Args:
+      df_loc (DataFrame): one row per bin with x, y, z (and optionally row_num, bay_num, level_num)
+
+    Returns:
+      (indptr, indices): neighbors of row i are indices[indptr[i]:indptr[i + 1]]
+      (row positions in df_loc), left neighbor first.
+    """
+    n = len(df_loc)
+
+    keys = None
+    if {"row_num", "bay_num", "level_num"}.issubset(df_loc.columns):
+        g = df_loc[["row_num", "level_num", "bay_num"]].apply(pd.to_numeric, errors="coerce")
+        valid = g.notna().all(axis=1).to_numpy()
+        if valid.any():
+            rows = np.flatnonzero(valid)
+            keys = g.to_numpy(dtype=float)[rows]
+            keys[:, 2] = np.trunc(keys[:, 2])
+            step = 1.0  # consecutive bays only
+
+    if keys is None:
+        rows = np.arange(n)
+        keys = df_loc[["y", "z", "x"]].to_numpy(dtype=float)
+        step = None  # any gap along X
+
+    s = np.lexsort((keys[:, 2], keys[:, 1], keys[:, 0]))
+    order, k = rows[s], keys[s]
+
+    linked = (k[1:, 0] == k[:-1, 0]) & (k[1:, 1] == k[:-1, 1])
+    if step is not None:
+        linked &= (k[1:, 2] - k[:-1, 2]) == step
+    left, right = order[:-1][linked], order[1:][linked]
+
+    # (bin, slot, neighbor): slot 0 = left neighbor, slot 1 = right neighbor
+    src = np.concatenate([right, left])
+    dst = np.concatenate([left, right])
+    slot = np.concatenate([np.zeros(left.size, dtype=np.int64), np.ones(left.size, dtype=np.int64)])
+    e = np.lexsort((slot, src))
+
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+    return indptr, dst[e].astype(np.int64)